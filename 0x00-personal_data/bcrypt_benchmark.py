@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""
+This module measures how many bcrypt hashes per second
+hash_passwords_many reaches for a range of worker counts.
+"""
+
+import argparse
+import time
+from typing import Dict, Iterable, List, Optional
+
+from encrypt_password import default_workers, hash_passwords_many
+
+
+def benchmark(count: int = 64,
+              worker_counts: Optional[Iterable[int]] = None
+              ) -> Dict[int, float]:
+    """
+    Hash count passwords with each worker count and measure throughput.
+
+    :param count: Number of passwords hashed per run.
+    :param worker_counts: The worker counts to measure, from 1 up to
+    twice the number of CPUs by default.
+    :return: Dictionary mapping each worker count to hashes per second.
+    """
+    if worker_counts is None:
+        cpus = default_workers()
+        worker_counts = sorted({1, 2, 4, cpus, cpus * 2})
+    passwords = [f"benchmark-password-{i}" for i in range(count)]
+    results = {}
+    for workers in worker_counts:
+        started = time.perf_counter()
+        for _ in hash_passwords_many(passwords, workers):
+            pass
+        results[workers] = count / (time.perf_counter() - started)
+    return results
+
+
+def main(argv: Optional[List[str]] = None):
+    """
+    Main function that prints hashes per second against worker count.
+
+    :param argv: The command line arguments, sys.argv[1:] by default.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument("--count", type=int, default=64)
+    parser.add_argument("--workers", type=int, nargs="*", default=None)
+    args = parser.parse_args(argv)
+
+    results = benchmark(args.count, args.workers)
+    baseline = results[min(results)]
+    print(f"{'workers':>8} {'hashes/s':>10} {'speedup':>8}")
+    for workers, rate in results.items():
+        print(f"{workers:>8} {rate:>10.1f} {rate / baseline:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
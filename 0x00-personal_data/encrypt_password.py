@@ -1,10 +1,137 @@
 #!/usr/bin/env python3
 """
-This module provides a function to hash a password using bcrypt.
+This module provides functions to hash passwords using bcrypt and to
+validate them, one at a time or in bulk on a pool of threads.
 """
 
+import os
+import threading
+import time
+from concurrent.futures import (FIRST_COMPLETED, Future, ThreadPoolExecutor,
+                                wait)
+from typing import Callable, Dict, Iterable, Iterator, Optional, Tuple, TypeVar
+
 import bcrypt
 
+T = TypeVar('T')
+R = TypeVar('R')
+
+DEFAULT_ROUNDS = 12
+MIN_ROUNDS = 4
+MIN_CALIBRATED_ROUNDS = 10
+MAX_ROUNDS = 31
+
+_target_rounds: Optional[int] = None
+_target_lock = threading.Lock()
+
+
+def _time_hash(rounds: int, samples: int = 3) -> float:
+    """
+    Measure the fastest of a few bcrypt hashes at the given cost.
+
+    :param rounds: The bcrypt work factor (log2 of the iterations).
+    :param samples: Number of hashes measured.
+    :return: The hash latency in milliseconds.
+    """
+    salt = bcrypt.gensalt(rounds)
+    best = float('inf')
+    for _ in range(samples):
+        started = time.perf_counter()
+        bcrypt.hashpw(b"calibration-password", salt)
+        best = min(best, time.perf_counter() - started)
+    return best * 1000
+
+
+def calibrate_cost(target_ms: float = 50.0,
+                   min_rounds: int = MIN_CALIBRATED_ROUNDS,
+                   max_rounds: int = MAX_ROUNDS, samples: int = 3) -> int:
+    """
+    Pick the highest bcrypt work factor whose hash latency on this
+    machine stays within target_ms.
+
+    Each extra round doubles the latency, so the cost is extrapolated
+    from a cheap measurement and then confirmed with one measurement at
+    the chosen cost. A slow or busy machine never gets a cost below
+    min_rounds.
+
+    :param target_ms: The wanted hash latency in milliseconds.
+    :param min_rounds: The lowest work factor ever returned.
+    :param max_rounds: The highest work factor ever returned.
+    :param samples: Number of hashes measured per cost.
+    :return: The calibrated work factor.
+    """
+    rounds = min_rounds
+    elapsed = _time_hash(rounds, samples)
+    while elapsed < min(5.0, target_ms / 2) and rounds < max_rounds:
+        rounds += 1
+        elapsed = _time_hash(rounds, samples)
+    while rounds < max_rounds and elapsed * 2 <= target_ms:
+        rounds += 1
+        elapsed *= 2
+    if rounds > min_rounds and _time_hash(rounds, samples) > target_ms:
+        rounds -= 1
+    return rounds
+
+
+def _check_rounds(rounds: int) -> int:
+    """
+    Validate a bcrypt work factor.
+
+    :param rounds: The bcrypt work factor.
+    :return: The work factor, if it is within bcrypt's range.
+    """
+    if not MIN_ROUNDS <= rounds <= MAX_ROUNDS:
+        raise ValueError(f"rounds must be between {MIN_ROUNDS} "
+                         f"and {MAX_ROUNDS}")
+    return rounds
+
+
+def set_target_cost(rounds: int):
+    """
+    Set the work factor used by hash_password and expected by
+    verify_and_rehash.
+
+    :param rounds: The bcrypt work factor.
+    """
+    global _target_rounds
+    _check_rounds(rounds)
+    with _target_lock:
+        _target_rounds = rounds
+
+
+def get_target_cost() -> int:
+    """
+    Return the work factor used for new hashes.
+
+    Unless set_target_cost was called, it is taken from the BCRYPT_ROUNDS
+    environment variable, or calibrated once against BCRYPT_TARGET_MS
+    milliseconds, or bcrypt's default of 12.
+
+    :return: The bcrypt work factor.
+    """
+    global _target_rounds
+    with _target_lock:
+        if _target_rounds is None:
+            if os.environ.get('BCRYPT_ROUNDS'):
+                _target_rounds = _check_rounds(
+                    int(os.environ['BCRYPT_ROUNDS']))
+            elif os.environ.get('BCRYPT_TARGET_MS'):
+                _target_rounds = calibrate_cost(
+                    float(os.environ['BCRYPT_TARGET_MS']))
+            else:
+                _target_rounds = DEFAULT_ROUNDS
+        return _target_rounds
+
+
+def hash_cost(hashed_password: bytes) -> int:
+    """
+    Return the work factor a bcrypt hash was computed with.
+
+    :param hashed_password: A hash like b'$2b$12$...'.
+    :return: The work factor.
+    """
+    return int(hashed_password.split(b'$')[2])
+
 
 def hash_password(password: str) -> bytes:
     """
@@ -14,7 +141,7 @@ def hash_password(password: str) -> bytes:
     :param password: The password to hash.
     :return: The salted, hashed password as a byte string.
     """
-    salt = bcrypt.gensalt()
+    salt = bcrypt.gensalt(get_target_cost())
     hashed = bcrypt.hashpw(password.encode(), salt)
     return hashed
 
@@ -32,3 +159,90 @@ def is_valid(hashed_password: bytes, password: str) -> bool:
     if bcrypt.checkpw(encoded, hashed_password):
         pwd_valid = True
     return pwd_valid
+
+
+def verify_and_rehash(hashed_password: bytes,
+                      password: str) -> Tuple[bool, Optional[bytes]]:
+    """
+    Validate a password and, when its hash was computed with a work
+    factor below the target one, return a fresh hash to store. Stronger
+    hashes are kept as they are.
+
+    :param hashed_password: The hashed password to check against.
+    :param password: The plain text password to validate.
+    :return: Tuple of whether the password matches and the new hash, or
+    None when the password is wrong or the stored hash is current.
+    """
+    if not is_valid(hashed_password, password):
+        return False, None
+    if hash_cost(hashed_password) >= get_target_cost():
+        return True, None
+    return True, hash_password(password)
+
+
+def default_workers() -> int:
+    """
+    Return the default size of the hashing thread pool: one thread per
+    CPU, since bcrypt releases the GIL while it hashes.
+
+    :return: The number of worker threads.
+    """
+    return os.cpu_count() or 1
+
+
+def _map_unordered(func: Callable[[T], R], items: Iterable[T],
+                   workers: Optional[int] = None
+                   ) -> Iterator[Tuple[int, R]]:
+    """
+    Apply func to every item on a thread pool and yield the results as
+    they finish. At most a few tasks per worker are in flight, so items
+    can be an arbitrarily long iterator.
+
+    :param func: The function to apply.
+    :param items: The items to process.
+    :param workers: Number of threads, default_workers() by default.
+    :return: Iterator of (index of the item, result) in completion order.
+    """
+    workers = workers or default_workers()
+    window = workers * 4
+    pending: Dict[Future, int] = {}
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for index, item in enumerate(items):
+            pending[executor.submit(func, item)] = index
+            if len(pending) >= window:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield pending.pop(future), future.result()
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield pending.pop(future), future.result()
+
+
+def hash_passwords_many(passwords: Iterable[str],
+                        workers: Optional[int] = None
+                        ) -> Iterator[Tuple[int, bytes]]:
+    """
+    Hash many passwords in parallel and stream the hashes back as they
+    are computed.
+
+    :param passwords: The passwords to hash.
+    :param workers: Number of threads, one per CPU by default.
+    :return: Iterator of (index of the password, salted hash), in
+    completion order.
+    """
+    return _map_unordered(hash_password, passwords, workers)
+
+
+def verify_many(pairs: Iterable[Tuple[bytes, str]],
+                workers: Optional[int] = None) -> Iterator[Tuple[int, bool]]:
+    """
+    Validate many (hashed_password, password) pairs in parallel and
+    stream the results back as they are computed.
+
+    :param pairs: The (hashed_password, password) pairs to check.
+    :param workers: Number of threads, one per CPU by default.
+    :return: Iterator of (index of the pair, whether it matches), in
+    completion order.
+    """
+    return _map_unordered(lambda pair: is_valid(*pair), pairs, workers)
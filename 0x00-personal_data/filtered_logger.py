@@ -8,11 +8,113 @@ and a get_logger function to configure a logger with specific settings.
 import os
 import re
 from os import environ
+import argparse
+import atexit
 import logging
-from typing import List, Tuple
+import multiprocessing
+import queue
+import sys
+import threading
+import time
+from collections import deque
+from functools import lru_cache
+from itertools import islice
+from typing import (Any, Callable, Deque, Dict, Iterable, Iterator, List,
+                    Mapping, Optional, Sequence, TextIO, Tuple, Union)
 import mysql.connector
 
 
+class RedactionEngine:
+    """
+    Redaction engine compiled once for a given set of fields, redaction
+    text and separator, and reused for every message it obfuscates.
+    """
+
+    def __init__(self, fields: Tuple[str, ...], redaction: str,
+                 separator: str):
+        """
+        Compile the single pattern matching every field and its value.
+
+        :param fields: Tuple of strings representing fields to obfuscate.
+        :param redaction: String representing the replacement text.
+        :param separator: The field separator in the log message.
+        """
+        self.fields = tuple(fields)
+        self.redaction = redaction
+        self.separator = separator
+        alternation = '|'.join(re.escape(field) for field in self.fields)
+        self.pattern = re.compile(
+            f'({alternation})=[^{re.escape(separator)}]+')
+        self.replacement = r'\1=' + redaction.replace('\\', r'\\')
+        self._field_set = frozenset(self.fields)
+        self._masks: Dict[Tuple[str, ...], Tuple[bool, ...]] = {}
+
+    def redact(self, message: str) -> str:
+        """
+        Obfuscate every configured field of the message in a single pass.
+
+        :param message: The log message.
+        :return: The obfuscated log message.
+        """
+        if not self.fields:
+            return message
+        return self.pattern.sub(self.replacement, message)
+
+    def column_mask(self, columns: Sequence[str]) -> Tuple[bool, ...]:
+        """
+        Return, for each column name, whether its value must be obfuscated.
+
+        :param columns: The column names of a row.
+        :return: Tuple of booleans aligned with the columns.
+        """
+        columns = tuple(columns)
+        mask = self._masks.get(columns)
+        if mask is None:
+            mask = tuple(column in self._field_set for column in columns)
+            self._masks[columns] = mask
+        return mask
+
+    def render(self, row: Union[Mapping[str, Any], Sequence[Any]],
+               columns: Optional[Sequence[str]] = None) -> str:
+        """
+        Render a structured row as a "key=value; " log line, obfuscating
+        the configured fields by key instead of by regex.
+
+        :param row: A mapping of column names to values, or a sequence of
+        values aligned with columns.
+        :param columns: The column names when row is a sequence.
+        :return: The obfuscated log line.
+        """
+        if isinstance(row, Mapping):
+            columns = tuple(row.keys())
+            values = row.values()
+        elif columns is None:
+            raise ValueError("columns are required to render a sequence row")
+        else:
+            values = row
+        redaction = self.redaction
+        sep = self.separator
+        return ' '.join(
+            f'{column}={redaction if masked else value}{sep}'
+            for column, value, masked
+            in zip(columns, values, self.column_mask(columns)))
+
+
+@lru_cache(maxsize=128)
+def get_redaction_engine(fields: Tuple[str, ...], redaction: str,
+                         separator: str) -> RedactionEngine:
+    """
+    Return the cached RedactionEngine for the given settings, compiling
+    it on first use.
+
+    :param fields: Tuple of strings representing fields to obfuscate.
+    :param redaction: String representing the replacement text.
+    :param separator: The field separator in the log message.
+    :return: The RedactionEngine for these settings.
+    """
+    return RedactionEngine(fields, redaction, separator)
+
+
 def filter_datum(fields: List[str], redaction: str,
                  message: str, separator: str) -> str:
     """
@@ -24,8 +126,8 @@ def filter_datum(fields: List[str], redaction: str,
     :param separator: The field separator in the log message.
     :return: The obfuscated log message.
     """
-    pattern = '|'.join(f'(?<={field}=)[^{separator}]+' for field in fields)
-    return re.sub(pattern, redaction, message)
+    engine = get_redaction_engine(tuple(fields), redaction, separator)
+    return engine.redact(message)
 
 
 class RedactingFormatter(logging.Formatter):
@@ -45,6 +147,8 @@ class RedactingFormatter(logging.Formatter):
         """
         super(RedactingFormatter, self).__init__(self.FORMAT)
         self.fields = fields
+        self.engine = get_redaction_engine(tuple(fields), self.REDACTION,
+                                           self.SEPARATOR)
 
     def format(self, record: logging.LogRecord) -> str:
         """
@@ -53,18 +157,243 @@ class RedactingFormatter(logging.Formatter):
         :param record: The log record to format.
         :return: The formatted log record as a string.
         """
-        record.msg = filter_datum(self.fields, self.REDACTION,
-                                  record.msg, self.SEPARATOR)
+        record.msg = self.redact(record)
         return super(RedactingFormatter, self).format(record)
 
+    def redact(self, record: logging.LogRecord) -> str:
+        """
+        Return the obfuscated message of a record. A string message is
+        filtered with the redaction engine; a mapping, or a sequence
+        logged with ``extra={"columns": [...]}``, is masked by key and
+        rendered once.
+
+        The result is cached on the record as ``redacted_msg`` so every
+        other handler whose formatter shares the same engine reuses it,
+        and the message as logged is kept in ``original_msg``.
+
+        :param record: The log record to redact.
+        :return: The obfuscated message.
+        """
+        if getattr(record, 'redacted_by', None) is self.engine:
+            return record.redacted_msg
+        original = record.__dict__.setdefault('original_msg', record.msg)
+        if isinstance(original, str):
+            redacted = self.engine.redact(original)
+        else:
+            redacted = self.engine.render(original,
+                                          getattr(record, 'columns', None))
+        record.redacted_msg = redacted
+        record.redacted_by = self.engine
+        return redacted
+
+
+class BackgroundQueueHandler(logging.Handler):
+    """
+    Handler that only enqueues records on the caller's thread and lets a
+    background writer thread redact, format and write them in batches.
+    """
+
+    OVERFLOW_POLICIES = ("block", "drop_oldest")
+
+    def __init__(self, target: logging.Handler, queue_size: int = 10000,
+                 batch_size: int = 100, flush_interval: float = 0.5,
+                 overflow: str = "block"):
+        """
+        Initialize the handler and start its writer thread.
+
+        :param target: The handler that formats and writes the records.
+        :param queue_size: Maximum number of records waiting in the queue.
+        :param batch_size: Maximum number of records written per flush.
+        :param flush_interval: Seconds to wait for a batch to fill up.
+        :param overflow: "block" to wait for room when the queue is full,
+        "drop_oldest" to discard the oldest waiting record instead.
+        """
+        if overflow not in self.OVERFLOW_POLICIES:
+            raise ValueError(f"overflow must be one of "
+                             f"{self.OVERFLOW_POLICIES}")
+        super(BackgroundQueueHandler, self).__init__()
+        self.target = target
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self.overflow = overflow
+        self.queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self.queued = 0
+        self.dropped = 0
+        self.flushed = 0
+        self._counter_lock = threading.Lock()
+        self._closed = False
+        self._sentinel = object()
+        self._thread = threading.Thread(target=self._run,
+                                        name="user_data-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def emit(self, record: logging.LogRecord):
+        """
+        Enqueue the record without formatting it. Once the handler is
+        closed the record is dropped, and if the writer thread is gone it
+        is written on the caller's thread instead.
+
+        :param record: The log record to enqueue.
+        """
+        if self._closed:
+            with self._counter_lock:
+                self.dropped += 1
+            return
+        if self.overflow == "block":
+            queued = self._put_blocking(record)
+        else:
+            queued = self._put_dropping_oldest(record)
+        if not queued:
+            self._write([record])
+            return
+        with self._counter_lock:
+            self.queued += 1
+
+    def _put_blocking(self, item: Any) -> bool:
+        """
+        Wait for room in the queue as long as the writer thread runs.
+
+        :param item: The record or sentinel to enqueue.
+        :return: True if the item was enqueued, False if the writer is
+        gone.
+        """
+        while self._thread.is_alive():
+            try:
+                self.queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def _put_dropping_oldest(self, record: logging.LogRecord) -> bool:
+        """
+        Enqueue the record, discarding the oldest waiting ones while the
+        queue is full.
+
+        :param record: The log record to enqueue.
+        :return: True if the record was enqueued, False if the writer is
+        gone.
+        """
+        while True:
+            if not self._thread.is_alive():
+                return False
+            try:
+                self.queue.put_nowait(record)
+                return True
+            except queue.Full:
+                pass
+            try:
+                self.queue.get_nowait()
+            except queue.Empty:
+                continue
+            with self._counter_lock:
+                self.dropped += 1
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Return the queued, dropped, flushed and pending record counters.
+
+        :return: Dictionary of counters.
+        """
+        with self._counter_lock:
+            return {"queued": self.queued, "dropped": self.dropped,
+                    "flushed": self.flushed, "pending": self.queue.qsize()}
+
+    def _run(self):
+        """
+        Writer loop: collect up to batch_size records, or whatever arrived
+        within flush_interval, and write them with a single flush.
+        """
+        while True:
+            batch = []
+            item = self.queue.get()
+            deadline = time.monotonic() + self.flush_interval
+            while item is not self._sentinel:
+                batch.append(item)
+                if len(batch) >= self.batch_size:
+                    break
+                timeout = deadline - time.monotonic()
+                try:
+                    if timeout > 0:
+                        item = self.queue.get(timeout=timeout)
+                    else:
+                        item = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+            self._write(batch)
+            if item is self._sentinel:
+                return
+
+    def _write(self, batch: List[logging.LogRecord]):
+        """
+        Format and write a batch of records through the target handler.
+        A failing write is reported through the target's handleError and
+        its batch counted as dropped, so that the writer thread keeps
+        running.
+
+        :param batch: The records to write.
+        """
+        if not batch:
+            return
+        target = self.target
+        target.acquire()
+        try:
+            records = [record for record in batch
+                       if record.levelno >= target.level
+                       and target.filter(record)]
+            stream = getattr(target, "stream", None)
+            if stream is not None:
+                lines = []
+                for record in records:
+                    try:
+                        lines.append(target.format(record) + target.terminator)
+                    except Exception:
+                        target.handleError(record)
+                stream.write(''.join(lines))
+            else:
+                for record in records:
+                    target.emit(record)
+            target.flush()
+        except Exception:
+            target.handleError(batch[0])
+            with self._counter_lock:
+                self.dropped += len(batch)
+            return
+        finally:
+            target.release()
+        with self._counter_lock:
+            self.flushed += len(batch)
+
+    def close(self):
+        """
+        Stop the writer thread after it has written every queued record,
+        then close the target handler.
+        """
+        if self._closed:
+            return
+        self._closed = True
+        if self._put_blocking(self._sentinel):
+            self._thread.join()
+        self.target.close()
+        super(BackgroundQueueHandler, self).close()
+
 
 PII_FIELDS: Tuple[str, ...] = ("name", "email", "phone", "ssn", "password")
 
 
-def get_logger() -> logging.Logger:
+def get_logger(queued: bool = False, queue_size: int = 10000,
+               batch_size: int = 100, flush_interval: float = 0.5,
+               overflow: str = "block") -> logging.Logger:
     """
     Create and configure a logger named 'user_data' to log obfuscated messages.
 
+    :param queued: When True, records go through a bounded in-memory queue
+    and are redacted, formatted and written by a background thread.
+    :param queue_size: Maximum number of records waiting in the queue.
+    :param batch_size: Maximum number of records written per flush.
+    :param flush_interval: Seconds the writer waits for a batch to fill up.
+    :param overflow: "block" or "drop_oldest" when the queue is full.
     :return: Configured logger object.
     """
     logger = logging.getLogger("user_data")
@@ -75,7 +404,12 @@ def get_logger() -> logging.Logger:
     formatter = RedactingFormatter(fields=list(PII_FIELDS))
     stream_handler.setFormatter(formatter)
 
-    logger.addHandler(stream_handler)
+    if queued:
+        logger.addHandler(BackgroundQueueHandler(
+            stream_handler, queue_size=queue_size, batch_size=batch_size,
+            flush_interval=flush_interval, overflow=overflow))
+    else:
+        logger.addHandler(stream_handler)
 
     return logger
 
@@ -100,25 +434,579 @@ def get_db() -> mysql.connector.connection.MySQLConnection:
     return connect
 
 
-def main():
+class PooledConnection:
+    """
+    Connection checked out of a ConnectionPool. It behaves like the
+    wrapped connection, except that close() hands it back to the pool.
+    """
+
+    def __init__(self, pool: "ConnectionPool", connection: Any,
+                 created_at: float):
+        """
+        Wrap a connection checked out of pool.
+
+        :param pool: The pool the connection belongs to.
+        :param connection: The underlying database connection.
+        :param created_at: Monotonic time the connection was opened.
+        """
+        self._pool = pool
+        self._connection = connection
+        self._created_at = created_at
+
+    def __getattr__(self, name: str) -> Any:
+        """
+        Delegate every other attribute to the underlying connection.
+
+        :param name: The attribute name.
+        :return: The attribute of the underlying connection.
+        """
+        if self._connection is None:
+            raise AttributeError(f"connection already returned: {name}")
+        return getattr(self._connection, name)
+
+    def close(self):
+        """
+        Return the connection to its pool instead of closing it.
+        """
+        if self._connection is not None:
+            self._pool.release(self._connection, self._created_at)
+            self._connection = None
+
+    def __enter__(self) -> "PooledConnection":
+        """
+        Use the connection as a context manager.
+
+        :return: The pooled connection itself.
+        """
+        return self
+
+    def __exit__(self, *exc_info):
+        """
+        Return the connection to its pool on exit.
+        """
+        self.close()
+
+
+class ConnectionPool:
+    """
+    Pool of warm database connections, health-checked on checkout and
+    recycled after a maximum lifetime.
+    """
+
+    def __init__(self, connect: Callable[[], Any] = None, size: int = 5,
+                 max_lifetime: float = 3600.0):
+        """
+        Initialize an empty pool; connections are opened on demand.
+
+        :param connect: Callable opening a new connection, get_db by
+        default.
+        :param size: Maximum number of connections checked out at once.
+        :param max_lifetime: Seconds after which a connection is closed
+        and replaced on its next checkout.
+        """
+        self.connect = connect or get_db
+        self.size = size
+        self.max_lifetime = max_lifetime
+        self._idle: queue.LifoQueue = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+        self._pid = os.getpid()
+        self._stats_lock = threading.Lock()
+        self.checkouts = 0
+        self.created = 0
+        self.recycled = 0
+        self.discarded = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def acquire(self, timeout: Optional[float] = None) -> PooledConnection:
+        """
+        Check a healthy connection out of the pool, waiting for one to be
+        released when size connections are already in use.
+
+        :param timeout: Maximum seconds to wait, forever when None.
+        :return: The pooled connection; close() returns it to the pool.
+        """
+        self._forget_inherited()
+        started = time.monotonic()
+        if not self._slots.acquire(timeout=timeout):
+            raise TimeoutError("no database connection available")
+        waited = time.monotonic() - started
+        with self._stats_lock:
+            self.checkouts += 1
+            self.wait_total += waited
+            self.wait_max = max(self.wait_max, waited)
+        try:
+            connection, created_at = self._checkout()
+        except Exception:
+            self._slots.release()
+            raise
+        return PooledConnection(self, connection, created_at)
+
+    def _checkout(self) -> Tuple[Any, float]:
+        """
+        Return an idle connection that is young and healthy enough, or
+        open a new one.
+
+        :return: Tuple of the connection and its creation time.
+        """
+        while True:
+            try:
+                connection, created_at = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            if time.monotonic() - created_at > self.max_lifetime:
+                self._close_quietly(connection)
+                with self._stats_lock:
+                    self.recycled += 1
+            elif not self._is_healthy(connection):
+                self._close_quietly(connection)
+                with self._stats_lock:
+                    self.discarded += 1
+            else:
+                return connection, created_at
+        connection = self.connect()
+        with self._stats_lock:
+            self.created += 1
+        return connection, time.monotonic()
+
+    def release(self, connection: Any, created_at: float):
+        """
+        Reset the session of a checked-out connection and put it back into
+        the pool, or close it if the reset fails.
+
+        :param connection: The underlying database connection.
+        :param created_at: Monotonic time the connection was opened.
+        """
+        try:
+            if os.getpid() != self._pid:
+                return
+            if self._reset(connection):
+                self._idle.put((connection, created_at))
+            else:
+                self._close_quietly(connection)
+                with self._stats_lock:
+                    self.discarded += 1
+        finally:
+            self._slots.release()
+
+    @staticmethod
+    def _reset(connection: Any) -> bool:
+        """
+        Roll back any open transaction and clear the session state of a
+        connection, like mysql-connector's own pool does on return.
+
+        :param connection: The connection to reset.
+        :return: False if the connection cannot be reused, e.g. because a
+        result is still unread.
+        """
+        try:
+            if getattr(connection, "unread_result", False):
+                return False
+            reset_session = getattr(connection, "reset_session", None)
+            if reset_session is not None:
+                reset_session()
+            else:
+                connection.rollback()
+            return True
+        except Exception:
+            return False
+
+    def _forget_inherited(self):
+        """
+        Drop idle connections inherited through fork: their sockets belong
+        to the parent process, so a child opens its own.
+        """
+        if os.getpid() != self._pid:
+            self._pid = os.getpid()
+            self._idle = queue.LifoQueue()
+            self._slots = threading.BoundedSemaphore(self.size)
+
+    @staticmethod
+    def _is_healthy(connection: Any) -> bool:
+        """
+        Check that an idle connection can still talk to the server.
+
+        :param connection: The connection to check.
+        :return: True if the connection is usable.
+        """
+        is_connected = getattr(connection, "is_connected", None)
+        if is_connected is None:
+            return True
+        try:
+            return bool(is_connected())
+        except Exception:
+            return False
+
+    @staticmethod
+    def _close_quietly(connection: Any):
+        """
+        Close a connection, ignoring errors from a dead socket.
+
+        :param connection: The connection to close.
+        """
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+    def stats(self) -> Dict[str, float]:
+        """
+        Return checkout, connection and wait-time counters.
+
+        :return: Dictionary of counters; wait times are in seconds.
+        """
+        with self._stats_lock:
+            average = self.wait_total / self.checkouts if self.checkouts else 0
+            return {"checkouts": self.checkouts, "created": self.created,
+                    "recycled": self.recycled, "discarded": self.discarded,
+                    "idle": self._idle.qsize(), "wait_total": self.wait_total,
+                    "wait_avg": average, "wait_max": self.wait_max}
+
+    def close(self):
+        """
+        Close every idle connection of the pool.
+        """
+        while True:
+            try:
+                connection, _ = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            self._close_quietly(connection)
+
+
+_pool: Optional[ConnectionPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> ConnectionPool:
+    """
+    Return the process-wide connection pool, creating it on first use.
+
+    The pool connects with get_db, so it uses the same
+    PERSONAL_DATA_DB_* credentials, and is sized by
+    PERSONAL_DATA_DB_POOL_SIZE (default 5) and
+    PERSONAL_DATA_DB_POOL_MAX_LIFETIME in seconds (default 3600).
+
+    :return: The shared ConnectionPool.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ConnectionPool(
+                get_db,
+                size=int(environ.get('PERSONAL_DATA_DB_POOL_SIZE', '5')),
+                max_lifetime=float(environ.get(
+                    'PERSONAL_DATA_DB_POOL_MAX_LIFETIME', '3600')))
+            atexit.register(_pool.close)
+        return _pool
+
+
+def get_pooled_db() -> PooledConnection:
+    """
+    Check a connection out of the shared pool. Closing it returns it to
+    the pool instead of dropping the TCP connection.
+
+    :return: PooledConnection wrapping a MySQLConnection.
+    """
+    return get_pool().acquire()
+
+
+def stream_rows(cursor, batch_size: int = 1000) -> Iterator[tuple]:
+    """
+    Yield the rows of an executed cursor, fetching them batch_size at a
+    time so only one batch is held in memory.
+
+    :param cursor: An executed database cursor.
+    :param batch_size: Number of rows requested per fetchmany call.
+    :return: Iterator over the rows.
+    """
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            return
+        yield from rows
+
+
+class ThroughputCounter:
+    """
+    Counter of processed rows that periodically reports progress and
+    throughput.
+    """
+
+    def __init__(self, report_every: int = 0, stream: TextIO = None):
+        """
+        Initialize the counter.
+
+        :param report_every: Report after this many rows; 0 disables
+        periodic reports.
+        :param stream: Where reports are written, stderr by default.
+        """
+        self.report_every = report_every
+        self.stream = stream
+        self.count = 0
+        self.started = time.monotonic()
+
+    @property
+    def rate(self) -> float:
+        """
+        Rows processed per second since the counter was created.
+
+        :return: The throughput in rows per second.
+        """
+        elapsed = time.monotonic() - self.started
+        return self.count / elapsed if elapsed > 0 else 0.0
+
+    def track(self, rows: Iterable[Any]) -> Iterator[Any]:
+        """
+        Pass rows through unchanged while counting them.
+
+        :param rows: The rows to count.
+        :return: Iterator over the same rows.
+        """
+        for row in rows:
+            yield row
+            self.count += 1
+            if self.report_every and self.count % self.report_every == 0:
+                self.report()
+
+    def report(self):
+        """
+        Write the current row count and throughput.
+        """
+        print(f"{self.count} rows, {self.rate:.0f} rows/s",
+              file=self.stream or sys.stderr)
+
+
+def partition_rows(total: int, shards: int) -> List[Tuple[int, int]]:
+    """
+    Split total rows into at most shards contiguous row ranges of
+    near-equal size.
+
+    :param total: Number of rows in the table.
+    :param shards: Number of ranges wanted.
+    :return: List of (offset, limit) pairs, in row order.
+    """
+    shards = max(1, min(shards, total))
+    size, extra = divmod(total, shards)
+    ranges = []
+    offset = 0
+    for k in range(shards):
+        limit = size + (1 if k < extra else 0)
+        if limit:
+            ranges.append((offset, limit))
+        offset += limit
+    return ranges
+
+
+def table_columns(db, table: str = "users") -> Tuple[List[str], int]:
+    """
+    Return the column names and the row count of a table.
+
+    :param db: An open database connection.
+    :param table: Name of the table.
+    :return: Tuple of the column names and the number of rows.
+    """
+    cursor = db.cursor()
+    cursor.execute(f"SELECT * FROM {table} LIMIT 0;")
+    columns = [i[0] for i in cursor.description]
+    cursor.fetchall()
+    cursor.execute(f"SELECT COUNT(*) FROM {table};")
+    total = cursor.fetchone()[0]
+    cursor.close()
+    return columns, total
+
+
+def shard_chunks(rows: Iterator[tuple], ranges: List[Tuple[int, int]],
+                 batch_size: int) -> Iterator[Tuple[int, List[tuple]]]:
+    """
+    Cut a stream of rows into chunks of at most batch_size rows that never
+    straddle two row ranges. Rows past the last range go to the last one.
+
+    :param rows: The rows, in table order.
+    :param ranges: The (offset, limit) pairs of partition_rows.
+    :param batch_size: Maximum number of rows per chunk.
+    :return: Iterator over (range index, rows) pairs.
+    """
+    ends = [offset + limit for offset, limit in ranges]
+    k = 0
+    count = 0
+    while True:
+        size = batch_size
+        if k < len(ends) - 1:
+            size = min(size, ends[k] - count)
+        chunk = list(islice(rows, size))
+        if not chunk:
+            return
+        yield k, chunk
+        count += len(chunk)
+        if k < len(ends) - 1 and count >= ends[k]:
+            k += 1
+
+
+def redact_chunk(columns: Sequence[str], rows: Sequence[tuple]) -> str:
+    """
+    Redact and format a chunk of rows, one line per row.
+
+    :param columns: The column names of the users table.
+    :param rows: The rows to format.
+    :return: The formatted lines.
+    """
+    formatter = RedactingFormatter(fields=list(PII_FIELDS))
+    lines = []
+    for row in rows:
+        record = logging.LogRecord("user_data", logging.INFO, __file__,
+                                   0, row, (), None)
+        record.columns = columns
+        lines.append(formatter.format(record) + "\n")
+    return "".join(lines)
+
+
+def begin_snapshot(db):
+    """
+    Start a transaction that reads a consistent snapshot of the database:
+    START TRANSACTION WITH CONSISTENT SNAPSHOT on MySQL, a plain BEGIN on
+    connections without start_transaction, like sqlite3's.
+
+    :param db: An open database connection.
+    """
+    if hasattr(db, "start_transaction"):
+        db.start_transaction(consistent_snapshot=True)
+        return
+    cursor = db.cursor()
+    cursor.execute("BEGIN;")
+    cursor.close()
+
+
+def dump_sharded(connect: Callable[[], Any], shards: int,
+                 processes: Optional[int] = None, batch_size: int = 1000,
+                 output_dir: Optional[str] = None,
+                 stream: TextIO = None,
+                 begin: Callable[[Any], None] = begin_snapshot) -> int:
     """
-    Main function that retrieves all rows from the users table and
+    Dump the users table redacted, reading it once and redacting and
+    formatting chunks of batch_size rows in worker processes.
+
+    The row count and the rows are read in a single transaction started
+    by begin, WITH CONSISTENT SNAPSHOT on MySQL, so writes made during
+    the dump neither duplicate nor drop rows. At most two chunks per
+    process are in flight, which keeps memory flat whatever the size of
+    the table.
+
+    Without output_dir, chunks are written in row order to stream (stderr
+    by default, like get_logger). With output_dir, the rows are split into
+    shards contiguous ranges, each written to its own users.<k>.log file.
+
+    :param connect: Callable returning a new connection, such as get_db.
+    :param shards: Number of row ranges, i.e. of per-shard files.
+    :param processes: Number of worker processes, one per CPU by default.
+    :param batch_size: Number of rows fetched and redacted at a time.
+    :param output_dir: Directory for per-shard files.
+    :param stream: Where merged output is written.
+    :param begin: Callable starting the read transaction on a connection.
+    :return: Total number of rows dumped.
+    """
+    stream = stream or sys.stderr
+    window = 2 * (processes or os.cpu_count() or 1)
+    outputs: Dict[int, TextIO] = {}
+
+    def write(k: int, text: str):
+        if output_dir is None:
+            stream.write(text)
+            return
+        if k not in outputs:
+            for out in outputs.values():
+                out.close()
+            outputs.clear()
+            outputs[k] = open(os.path.join(output_dir, f"users.{k}.log"), "w")
+        outputs[k].write(text)
+
+    dumped = 0
+    db = connect()
+    try:
+        begin(db)
+        columns, total = table_columns(db)
+        cursor = db.cursor()
+        cursor.execute("SELECT * FROM users;")
+        chunks = shard_chunks(stream_rows(cursor, batch_size),
+                              partition_rows(total, shards), batch_size)
+        pending: Deque[Tuple[int, Any]] = deque()
+        with multiprocessing.Pool(processes) as pool:
+            for k, rows in chunks:
+                pending.append((k, pool.apply_async(redact_chunk,
+                                                    (columns, rows))))
+                dumped += len(rows)
+                if len(pending) >= window:
+                    k, result = pending.popleft()
+                    write(k, result.get())
+            while pending:
+                k, result = pending.popleft()
+                write(k, result.get())
+        cursor.close()
+    finally:
+        for out in outputs.values():
+            out.close()
+        db.rollback()
+        db.close()
+    stream.flush()
+    return dumped
+
+
+def main(batch_size: int = 1000, progress_every: int = 0, shards: int = 1,
+         processes: Optional[int] = None, output_dir: Optional[str] = None):
+    """
+    Main function that streams all rows from the users table and
     logs each row with sensitive fields obfuscated.
+
+    Rows are read through an unbuffered cursor batch_size at a time, so
+    memory stays flat whatever the size of the table. With more than one
+    shard, or an output directory, the table is dumped by dump_sharded,
+    which redacts the rows in worker processes instead.
+
+    :param batch_size: Number of rows fetched from the server at a time.
+    :param progress_every: Report progress every this many rows and once
+    at the end; 0 disables progress reports.
+    :param shards: Number of row ranges of a sharded dump.
+    :param processes: Number of worker processes for a sharded dump.
+    :param output_dir: Directory for per-shard output files.
     """
+    if shards > 1 or output_dir is not None:
+        dump_sharded(get_pooled_db, shards, processes=processes,
+                     batch_size=batch_size, output_dir=output_dir)
+        return
+
     db = get_db()
-    cursor = db.cursor()
+    cursor = db.cursor(buffered=False)
     cursor.execute("SELECT * FROM users;")
     field_names = [i[0] for i in cursor.description]
 
     logger = get_logger()
+    progress = ThroughputCounter(report_every=progress_every)
 
-    for row in cursor:
-        str_row = ''.join(f'{f}={str(r)}; ' for r, f in zip(row, field_names))
-        logger.info(str_row.strip())
+    for row in progress.track(stream_rows(cursor, batch_size)):
+        logger.info(row, extra={"columns": field_names})
+    if progress_every:
+        progress.report()
 
     cursor.close()
     db.close()
 
 
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    """
+    Parse the command line options of the module.
+
+    :param argv: The arguments, sys.argv[1:] by default.
+    :return: Namespace of keyword arguments for main.
+    """
+    parser = argparse.ArgumentParser(
+        description="Log the users table with PII fields obfuscated.")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--progress-every", type=int, default=0)
+    parser.add_argument("--shards", type=int, default=1)
+    parser.add_argument("--processes", type=int, default=None)
+    parser.add_argument("--output-dir", default=None)
+    return parser.parse_args(argv)
+
+
 if __name__ == "__main__":
-    main()
+    main(**vars(parse_args()))
@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+"""
+This module exports the users table, or a CSV file like user_data.csv,
+with the PII fields obfuscated, as CSV or JSON Lines written in large
+buffered chunks, optionally gzip-compressed.
+"""
+
+import argparse
+import csv
+import gzip
+import io
+import json
+import sys
+from typing import (Any, Iterable, Iterator, List, Optional, Sequence, TextIO,
+                    Tuple)
+
+from filtered_logger import (PII_FIELDS, RedactingFormatter, get_db,
+                             get_redaction_engine, stream_rows)
+
+FORMATS: Tuple[str, ...] = ("csv", "jsonl")
+BUFFER_SIZE = 1 << 20
+
+
+def read_csv(path: str) -> Tuple[List[str], Iterator[List[str]]]:
+    """
+    Open a CSV file whose first line holds the column names.
+
+    :param path: Path to the CSV file.
+    :return: Tuple of the column names and an iterator over the rows.
+    """
+    f = open(path, newline='', buffering=BUFFER_SIZE)
+    reader = csv.reader(f)
+    columns = next(reader, [])
+
+    def rows() -> Iterator[List[str]]:
+        with f:
+            yield from reader
+
+    return columns, rows()
+
+
+def read_table(table: str = "users",
+               batch_size: int = 1000) -> Tuple[List[str], Iterator[tuple]]:
+    """
+    Stream a database table through an unbuffered cursor.
+
+    :param table: Name of the table.
+    :param batch_size: Number of rows fetched at a time.
+    :return: Tuple of the column names and an iterator over the rows.
+    """
+    db = get_db()
+    cursor = db.cursor(buffered=False)
+    cursor.execute(f"SELECT * FROM {table};")
+    columns = [i[0] for i in cursor.description]
+
+    def rows() -> Iterator[tuple]:
+        try:
+            yield from stream_rows(cursor, batch_size)
+        finally:
+            cursor.close()
+            db.close()
+
+    return columns, rows()
+
+
+def redact_rows(columns: Sequence[str], rows: Iterable[Sequence[Any]],
+                fields: Sequence[str] = PII_FIELDS,
+                redaction: str = RedactingFormatter.REDACTION
+                ) -> Iterator[List[Any]]:
+    """
+    Replace the values of the PII columns of every row by the redaction.
+    Empty rows, like the blank lines of a CSV file, are skipped; shorter
+    rows are padded with None and cells past the last column are dropped,
+    since they cannot be matched to a field name.
+
+    :param columns: The column names of the rows.
+    :param rows: The rows to redact.
+    :param fields: The column names to obfuscate.
+    :param redaction: String representing the replacement text.
+    :return: Iterator over the redacted rows.
+    """
+    engine = get_redaction_engine(tuple(fields), redaction,
+                                  RedactingFormatter.SEPARATOR)
+    masked = [i for i, m in enumerate(engine.column_mask(columns)) if m]
+    width = len(columns)
+    for row in rows:
+        if not row:
+            continue
+        row = list(row[:width])
+        if len(row) < width:
+            row.extend([None] * (width - len(row)))
+        for i in masked:
+            row[i] = redaction
+        yield row
+
+
+def open_output(path: str, compress: bool = False) -> TextIO:
+    """
+    Open the export destination for buffered text writes.
+
+    :param path: Output file path, or "-" for stdout.
+    :param compress: Whether to gzip the output.
+    :return: A writable text stream.
+    """
+    if path == "-":
+        if compress:
+            raw = gzip.GzipFile(fileobj=sys.stdout.buffer, mode='wb')
+            return io.TextIOWrapper(raw, encoding='utf-8', newline='')
+        return sys.stdout
+    if compress:
+        return gzip.open(path, 'wt', encoding='utf-8', newline='')
+    return open(path, 'w', encoding='utf-8', newline='',
+                buffering=BUFFER_SIZE)
+
+
+def write_csv(out: TextIO, columns: Sequence[str],
+              rows: Iterable[Sequence[Any]], chunk_rows: int = 10000) -> int:
+    """
+    Write a header and the rows as CSV, chunk_rows rows per write call.
+
+    :param out: The output stream.
+    :param columns: The column names.
+    :param rows: The rows to write.
+    :param chunk_rows: Number of rows encoded before each write.
+    :return: The number of rows written.
+    """
+    chunk = io.StringIO()
+    writer = csv.writer(chunk)
+    writer.writerow(columns)
+    count = 0
+    for row in rows:
+        writer.writerow(row)
+        count += 1
+        if count % chunk_rows == 0:
+            out.write(chunk.getvalue())
+            chunk.seek(0)
+            chunk.truncate()
+    out.write(chunk.getvalue())
+    return count
+
+
+def write_jsonl(out: TextIO, columns: Sequence[str],
+                rows: Iterable[Sequence[Any]], chunk_rows: int = 10000) -> int:
+    """
+    Write the rows as JSON Lines objects, chunk_rows rows per write call.
+
+    :param out: The output stream.
+    :param columns: The column names.
+    :param rows: The rows to write.
+    :param chunk_rows: Number of rows encoded before each write.
+    :return: The number of rows written.
+    """
+    encode = json.JSONEncoder(default=str, ensure_ascii=False).encode
+    lines = []
+    count = 0
+    for row in rows:
+        lines.append(encode(dict(zip(columns, row))))
+        count += 1
+        if len(lines) >= chunk_rows:
+            lines.append('')
+            out.write('\n'.join(lines))
+            lines = []
+    if lines:
+        lines.append('')
+        out.write('\n'.join(lines))
+    return count
+
+
+def export(columns: Sequence[str], rows: Iterable[Sequence[Any]],
+           output: str, fmt: str = "csv", compress: bool = False,
+           chunk_rows: int = 10000) -> int:
+    """
+    Redact the PII fields of the rows and write them to output.
+
+    :param columns: The column names.
+    :param rows: The rows to export.
+    :param output: Output file path, or "-" for stdout.
+    :param fmt: "csv" or "jsonl".
+    :param compress: Whether to gzip the output.
+    :param chunk_rows: Number of rows encoded before each write.
+    :return: The number of rows exported.
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"fmt must be one of {FORMATS}")
+    write = write_csv if fmt == "csv" else write_jsonl
+    out = open_output(output, compress)
+    try:
+        return write(out, columns, redact_rows(columns, rows), chunk_rows)
+    finally:
+        if out is sys.stdout:
+            out.flush()
+        else:
+            out.close()
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    """
+    Parse the command line options of the module.
+
+    :param argv: The arguments, sys.argv[1:] by default.
+    :return: The parsed options.
+    """
+    parser = argparse.ArgumentParser(
+        description="Export users with PII fields obfuscated.")
+    parser.add_argument("--csv", dest="csv_path", default=None,
+                        help="read this CSV file instead of the database")
+    parser.add_argument("--table", default="users")
+    parser.add_argument("--format", dest="fmt", choices=FORMATS,
+                        default="csv")
+    parser.add_argument("--gzip", dest="compress", action="store_true")
+    parser.add_argument("--chunk-rows", type=int, default=10000)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("-o", "--output", default="-")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None):
+    """
+    Main function that exports the users table or a CSV file redacted.
+
+    :param argv: The command line arguments, sys.argv[1:] by default.
+    """
+    args = parse_args(argv)
+    if args.csv_path is not None:
+        columns, rows = read_csv(args.csv_path)
+    else:
+        columns, rows = read_table(args.table, args.batch_size)
+    count = export(columns, rows, args.output, args.fmt, args.compress,
+                   args.chunk_rows)
+    print(f"{count} rows exported", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Main file for the bcrypt functions: every password of a batch is hashed
+and verified once, long inputs are consumed a window at a time, the
+calibrated cost never drops below its floor, and only weaker hashes are
+rehashed on verify.
+"""
+
+import os
+import sys
+from itertools import count
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from encrypt_password import (MIN_CALIBRATED_ROUNDS,  # noqa: E402
+                              calibrate_cost, hash_cost, hash_password,
+                              hash_passwords_many, is_valid, set_target_cost,
+                              verify_and_rehash, verify_many)
+
+
+if __name__ == "__main__":
+    set_target_cost(4)
+    passwords = [f"password {i}" for i in range(200)]
+    hashed = dict(hash_passwords_many(passwords, workers=4))
+    assert sorted(hashed) == list(range(200))
+    assert all(is_valid(hashed[i], p) for i, p in enumerate(passwords))
+
+    pairs = [(hashed[i], p if i % 3 else "wrong")
+             for i, p in enumerate(passwords)]
+    results = list(verify_many(iter(pairs), workers=3))
+    assert sorted(i for i, _ in results) == list(range(200))
+    assert all(valid == bool(i % 3) for i, valid in results)
+    print("batch: OK")
+
+    consumed = []
+
+    def endless():
+        for i in count():
+            consumed.append(i)
+            yield f"password {i}"
+
+    results = hash_passwords_many(endless(), workers=2)
+    for _ in range(10):
+        next(results)
+    results.close()
+    assert len(consumed) <= 10 + 2 * 4, len(consumed)
+    print("bounded window: OK")
+
+    assert calibrate_cost(target_ms=0.001, samples=1) == \
+        MIN_CALIBRATED_ROUNDS
+    fast = calibrate_cost(target_ms=5, min_rounds=4, samples=1)
+    slow = calibrate_cost(target_ms=80, min_rounds=4, samples=1)
+    assert 4 <= fast <= slow <= 31, (fast, slow)
+    print("calibration: OK")
+
+    weak = hash_password("secret")
+    set_target_cost(5)
+    strong = hash_password("secret")
+    assert hash_cost(weak) == 4 and hash_cost(strong) == 5
+    valid, rehashed = verify_and_rehash(weak, "secret")
+    assert valid and hash_cost(rehashed) == 5 and is_valid(rehashed, "secret")
+    assert verify_and_rehash(weak, "wrong") == (False, None)
+    assert verify_and_rehash(strong, "secret") == (True, None)
+    set_target_cost(4)
+    assert verify_and_rehash(strong, "secret") == (True, None)
+    try:
+        set_target_cost(3)
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("cost below bcrypt's minimum accepted")
+    print("rehash: OK")
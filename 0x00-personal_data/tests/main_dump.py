@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Main file for dump_sharded: dumps a SQLite copy of the users table of
+main.sql, sharded and not, and checks the order and the content of what
+is written.
+"""
+
+import io
+import os
+import re
+import shutil
+import sqlite3
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from filtered_logger import dump_sharded, partition_rows  # noqa: E402
+
+
+def create_users(path: str, count: int):
+    """
+    Create the users table of main.sql in a SQLite database, with its
+    rows followed by generated ones up to count rows.
+
+    :param path: Path of the SQLite database.
+    :param count: Number of rows wanted.
+    """
+    with open(os.path.join(ROOT, "main.sql")) as f:
+        sql = f.read()
+    start = sql.index("CREATE TABLE users")
+    db = sqlite3.connect(path)
+    db.execute(sql[start:sql.index(";", start)])
+    for line in sql.splitlines():
+        if line.startswith("INSERT INTO users"):
+            db.execute(line)
+    for i in range(db.execute("SELECT COUNT(*) FROM users").fetchone()[0],
+                   count):
+        db.execute("INSERT INTO users VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                   (f"Name {i}", f"user{i}@hbtn.io", f"(555) 000-{i:04}",
+                    f"000-00-{i:04}", f"pwd{i}", f"10.0.{i // 256}.{i % 256}",
+                    "2019-11-14 06:14:24", f"agent {i}"))
+    db.commit()
+    db.close()
+
+
+def check_lines(lines, rows):
+    """
+    Check that lines are the rows, in order, with the PII fields redacted.
+
+    :param lines: The dumped lines.
+    :param rows: The (ip, user_agent) of the expected rows.
+    """
+    assert len(lines) == len(rows), (len(lines), len(rows))
+    for line, (ip, user_agent) in zip(lines, rows):
+        assert f"ip={ip};" in line and f"user_agent={user_agent};" in line
+        for field in ("name", "email", "phone", "ssn", "password"):
+            assert f"{field}=***;" in line, line
+        assert not re.search(r"@|pwd\d", line), line
+
+
+if __name__ == "__main__":
+    workdir = tempfile.mkdtemp()
+    path = os.path.join(workdir, "users.db")
+    create_users(path, 1000)
+    db = sqlite3.connect(path)
+    rows = db.execute("SELECT ip, user_agent FROM users").fetchall()
+    db.close()
+
+    def connect():
+        return sqlite3.connect(path)
+
+    out = io.StringIO()
+    dumped = dump_sharded(connect, 1, processes=2, batch_size=7, stream=out)
+    assert dumped == 1000
+    check_lines(out.getvalue().splitlines(), rows)
+    print("stream: OK")
+
+    for shards in (3, 4):
+        shard_dir = os.path.join(workdir, str(shards))
+        os.mkdir(shard_dir)
+        dumped = dump_sharded(connect, shards, processes=2, batch_size=64,
+                              output_dir=shard_dir)
+        assert dumped == 1000
+        ranges = partition_rows(1000, shards)
+        assert sorted(os.listdir(shard_dir)) == [
+            f"users.{k}.log" for k in range(shards)]
+        for k, (offset, limit) in enumerate(ranges):
+            with open(os.path.join(shard_dir, f"users.{k}.log")) as f:
+                check_lines(f.read().splitlines(),
+                            rows[offset:offset + limit])
+        print(f"{shards} shards: OK")
+    shutil.rmtree(workdir)
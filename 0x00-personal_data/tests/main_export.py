@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Main file for redacted_export: user_data.csv exported as CSV and JSON
+Lines, plain and gzipped, holds every row with the PII fields redacted.
+"""
+
+import csv
+import gzip
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+from contextlib import redirect_stderr
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from filtered_logger import PII_FIELDS  # noqa: E402
+from redacted_export import main, redact_rows  # noqa: E402
+
+
+def expected_rows(path: str):
+    """
+    Read a CSV file and redact its PII columns by name.
+
+    :param path: Path to the CSV file.
+    :return: Tuple of the column names and the redacted rows.
+    """
+    with open(path, newline='') as f:
+        reader = csv.DictReader(f)
+        columns = reader.fieldnames
+        rows = [[("***" if c in PII_FIELDS else row[c]) for c in columns]
+                for row in reader]
+    return columns, rows
+
+
+if __name__ == "__main__":
+    source = os.path.join(ROOT, "user_data.csv")
+    columns, rows = expected_rows(source)
+    workdir = tempfile.mkdtemp()
+    for fmt in ("csv", "jsonl"):
+        for compress in (False, True):
+            output = os.path.join(workdir, f"out.{fmt}")
+            args = ["--csv", source, "--format", fmt, "--chunk-rows", "7",
+                    "-o", output] + (["--gzip"] if compress else [])
+            stderr = io.StringIO()
+            with redirect_stderr(stderr):
+                main(args)
+            assert stderr.getvalue() == f"{len(rows)} rows exported\n"
+            opener = gzip.open if compress else open
+            with opener(output, 'rt', encoding='utf-8', newline='') as f:
+                if fmt == "csv":
+                    exported = list(csv.reader(f))
+                    assert exported[0] == columns
+                    assert exported[1:] == rows
+                else:
+                    exported = [json.loads(line) for line in f]
+                    assert exported == [dict(zip(columns, row))
+                                        for row in rows]
+            print(f"{fmt}{' gzip' if compress else ''}: OK")
+
+    ragged = [["a", "x@y", "1"], [], ["b"], ["c", "z@w", "2", "extra"]]
+    assert list(redact_rows(["name", "email", "n"], ragged)) == [
+        ["***", "***", "1"], ["***", "***", None], ["***", "***", "2"]]
+    print("ragged rows: OK")
+    shutil.rmtree(workdir)
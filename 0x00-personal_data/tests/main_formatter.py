@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Main file for RedactingFormatter: mappings and rows logged with their
+columns are rendered like the equivalent string message, redacted.
+"""
+
+import logging
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from filtered_logger import PII_FIELDS, RedactingFormatter  # noqa: E402
+
+COLUMNS = ("name", "email", "phone", "ssn", "password", "ip", "last_login",
+           "user_agent")
+ROW = ("Bob", "bob@dylan.com", "(555) 000", "000-00-0000", "pwd",
+       "10.0.0.1", "2019-11-14 06:14:24", "Mozilla/5.0; (Linux)")
+
+
+def record(msg, **extra):
+    """
+    Build an INFO record of the user_data logger, all logged at the
+    same time.
+
+    :param msg: The message logged.
+    :param extra: Attributes added to the record.
+    :return: The log record.
+    """
+    record = logging.LogRecord("user_data", logging.INFO, __file__, 1, msg,
+                               None, None)
+    record.created, record.msecs = 0, 0
+    record.__dict__.update(extra)
+    return record
+
+
+if __name__ == "__main__":
+    formatter = RedactingFormatter(fields=list(PII_FIELDS))
+    line = ' '.join(f"{c}={v};" for c, v in zip(COLUMNS, ROW))
+    expected = formatter.format(record(line))
+    assert "***" in expected and "bob@dylan.com" not in expected
+
+    assert formatter.format(record(dict(zip(COLUMNS, ROW)))) == expected
+    assert formatter.format(record(ROW, columns=COLUMNS)) == expected
+    assert formatter.format(record(list(ROW), columns=list(COLUMNS))) == \
+        expected
+    assert "user_agent=Mozilla/5.0; (Linux);" in \
+        formatter.format(record(ROW, columns=COLUMNS))
+    try:
+        formatter.format(record(ROW))
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("a row without columns was rendered")
+    print("structured: OK")
+
+    calls = []
+    engine = formatter.engine
+    engine.redact = lambda message: calls.append(message) or \
+        type(engine).redact(engine, message)
+    shared = RedactingFormatter(fields=list(PII_FIELDS))
+    other = RedactingFormatter(fields=["ip"])
+    r = record(line)
+    assert formatter.format(r) == expected
+    assert shared.format(r) == expected
+    assert calls == [line], calls
+    assert "ip=***;" in other.format(r) and "name=Bob;" in other.format(r)
+    assert r.original_msg == line
+    assert formatter.format(r) == expected
+    del engine.redact
+    print("once across handlers: OK")
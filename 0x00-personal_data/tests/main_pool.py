@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Main file for ConnectionPool, on SQLite connections: connections are
+reused, never more than size at once, rolled back before reuse, and
+recycled or discarded when too old or broken.
+"""
+
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from filtered_logger import ConnectionPool  # noqa: E402
+
+
+if __name__ == "__main__":
+    workdir = tempfile.mkdtemp()
+    path = os.path.join(workdir, "pool.db")
+    with sqlite3.connect(path) as db:
+        db.execute("CREATE TABLE users (name TEXT)")
+    db.close()
+
+    def connect():
+        return sqlite3.connect(path, check_same_thread=False)
+
+    pool = ConnectionPool(connect, size=3)
+    for _ in range(10):
+        with pool.acquire() as db:
+            db.execute("SELECT 1").fetchone()
+    assert pool.stats()["created"] == 1 and pool.stats()["idle"] == 1
+
+    with pool.acquire() as db:
+        db.execute("INSERT INTO users VALUES ('Bob')")
+    with pool.acquire() as db:
+        assert db.execute("SELECT COUNT(*) FROM users").fetchone() == (0,)
+    print("reuse: OK")
+
+    held = [pool.acquire() for _ in range(3)]
+    try:
+        pool.acquire(timeout=0.05)
+    except TimeoutError:
+        pass
+    else:
+        raise AssertionError("more than size connections checked out")
+    for db in held:
+        db.close()
+
+    in_use = []
+    peak = []
+    lock = threading.Lock()
+
+    def worker():
+        for _ in range(50):
+            with pool.acquire() as db:
+                with lock:
+                    in_use.append(db)
+                    peak.append(len(in_use))
+                db.execute("SELECT COUNT(*) FROM users").fetchone()
+                with lock:
+                    in_use.remove(db)
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert max(peak) <= 3 and pool.stats()["created"] <= 3, pool.stats()
+    print("size: OK")
+
+    pool.close()
+    assert pool.stats()["idle"] == 0
+    pool = ConnectionPool(connect, size=2, max_lifetime=0.05)
+    pool.acquire().close()
+    time.sleep(0.1)
+    pool.acquire().close()
+    assert pool.stats()["recycled"] == 1 and pool.stats()["created"] == 2
+
+    db = pool.acquire()
+    db._connection.close()
+    db.close()
+    assert pool.stats()["discarded"] == 1 and pool.stats()["idle"] == 0
+    with pool.acquire() as db:
+        assert db.execute("SELECT 1").fetchone() == (1,)
+    pool.close()
+    print("recycle: OK")
+    shutil.rmtree(workdir)
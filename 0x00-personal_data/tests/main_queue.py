@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Main file for BackgroundQueueHandler: queued records are all written, in
+order and redacted, the oldest are dropped under drop_oldest, and a
+failing write does not stop the writer thread.
+"""
+
+import io
+import logging
+import os
+import re
+import sys
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from filtered_logger import (PII_FIELDS,  # noqa: E402
+                             BackgroundQueueHandler, RedactingFormatter)
+
+
+class FailingStream(io.StringIO):
+    """
+    Stream whose writes fail while failing is set.
+    """
+
+    failing = False
+
+    def write(self, text: str) -> int:
+        """
+        Write the text, or raise OSError while failing is set.
+
+        :param text: The text to write.
+        :return: Number of characters written.
+        """
+        if self.failing:
+            raise OSError("disk full")
+        return super(FailingStream, self).write(text)
+
+
+def queue_handler(stream, **kwargs) -> BackgroundQueueHandler:
+    """
+    Queue handler redacting PII fields and writing to stream.
+
+    :param stream: The stream of the target handler.
+    :param kwargs: Arguments of BackgroundQueueHandler.
+    :return: The handler.
+    """
+    target = logging.StreamHandler(stream)
+    target.setFormatter(RedactingFormatter(fields=list(PII_FIELDS)))
+    return BackgroundQueueHandler(target, **kwargs)
+
+
+def make_logger(name: str, handler: logging.Handler) -> logging.Logger:
+    """
+    Logger writing only through handler.
+
+    :param name: Name of the logger.
+    :param handler: Its handler.
+    :return: The logger.
+    """
+    logger = logging.getLogger(name)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    logger.addHandler(handler)
+    return logger
+
+
+if __name__ == "__main__":
+    stream = io.StringIO()
+    handler = queue_handler(stream, queue_size=50, batch_size=7,
+                            flush_interval=0.01)
+    logger = make_logger("main_queue.block", handler)
+    threads = [threading.Thread(target=lambda t=t: [
+        logger.info("thread=%d; i=%d; email=x@y;", t, i)
+        for i in range(500)]) for t in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    handler.close()
+    lines = stream.getvalue().splitlines()
+    assert len(lines) == 2000 and all("email=***;" in x for x in lines)
+    for t in range(4):
+        mine = [int(re.search(r"i=(\d+);", x).group(1))
+                for x in lines if f"thread={t};" in x]
+        assert mine == list(range(500)), t
+    assert handler.stats() == {"queued": 2000, "dropped": 0,
+                               "flushed": 2000, "pending": 0}
+    logger.info("after close")
+    assert handler.stats()["dropped"] == 1
+    print("block: OK")
+
+    stream = io.StringIO()
+    handler = queue_handler(stream, queue_size=10, batch_size=10,
+                            flush_interval=0.01, overflow="drop_oldest")
+    logger = make_logger("main_queue.drop", handler)
+    handler.target.acquire()
+    for i in range(1000):
+        logger.info("i=%d;", i)
+    handler.target.release()
+    handler.close()
+    stats = handler.stats()
+    lines = stream.getvalue().splitlines()
+    assert stats["flushed"] + stats["dropped"] == 1000, stats
+    assert stats["dropped"] > 0 and len(lines) == stats["flushed"]
+    assert lines[-1].endswith("i=999;"), lines[-1]
+    print("drop_oldest: OK")
+
+    stream = FailingStream()
+    handler = queue_handler(stream, batch_size=1, flush_interval=0.01)
+    handler.target.handleError = lambda record: None
+    logger = make_logger("main_queue.fail", handler)
+    stream.failing = True
+    logger.info("lost")
+    while handler.stats()["dropped"] == 0:
+        pass
+    stream.failing = False
+    logger.info("written")
+    handler.close()
+    assert stream.getvalue().splitlines()[-1].endswith("written")
+    assert handler.stats()["dropped"] == 1
+    print("failing write: OK")
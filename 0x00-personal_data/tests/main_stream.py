@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Main file for stream_rows and ThroughputCounter: a SQLite copy of the
+users table of main.sql is read back whole, in order, one fetchmany
+batch at a time, and progress is reported every report_every rows.
+"""
+
+import io
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from filtered_logger import ThroughputCounter, stream_rows  # noqa: E402
+from main_dump import create_users  # noqa: E402
+
+
+class CountingCursor:
+    """
+    Cursor recording the size of every fetchmany batch.
+    """
+
+    def __init__(self, cursor: sqlite3.Cursor):
+        """
+        Wrap an executed cursor.
+
+        :param cursor: The cursor to wrap.
+        """
+        self.cursor = cursor
+        self.batches = []
+
+    def fetchmany(self, size: int) -> list:
+        """
+        Fetch up to size rows and record how many came back.
+
+        :param size: Number of rows requested.
+        :return: The rows.
+        """
+        rows = self.cursor.fetchmany(size)
+        self.batches.append(len(rows))
+        return rows
+
+
+if __name__ == "__main__":
+    workdir = tempfile.mkdtemp()
+    path = os.path.join(workdir, "users.db")
+    create_users(path, 1000)
+    db = sqlite3.connect(path)
+    expected = db.execute("SELECT * FROM users").fetchall()
+
+    for batch_size in (1, 7, 1000, 5000):
+        cursor = CountingCursor(db.execute("SELECT * FROM users"))
+        assert list(stream_rows(cursor, batch_size)) == expected
+        assert max(cursor.batches) <= batch_size
+        assert cursor.batches[-1] == 0
+    cursor = CountingCursor(db.execute("SELECT * FROM users"))
+    rows = stream_rows(cursor, 10)
+    next(rows)
+    assert cursor.batches == [10]
+    print("stream_rows: OK")
+
+    out = io.StringIO()
+    progress = ThroughputCounter(report_every=300, stream=out)
+    rows = list(progress.track(stream_rows(db.execute(
+        "SELECT * FROM users"), 64)))
+    assert rows == expected and progress.count == 1000
+    reports = out.getvalue().splitlines()
+    assert [line.split()[0] for line in reports] == ["300", "600", "900"]
+    assert all(line.endswith(" rows/s") for line in reports)
+    print("progress: OK")
+    db.close()
+    shutil.rmtree(workdir)
@@ -4,7 +4,7 @@ Route module for the API.
 """
 from os import getenv
 from api.v1.views import app_views
-from api.v1.auth.auth import Auth
+from api.v1.auth.auth import Auth, PathMatcher
 from flask import Flask, jsonify, request, abort
 from flask_cors import CORS
 
@@ -22,6 +22,15 @@ if auth_type:
         from api.v1.auth.auth import Auth
         auth = Auth()
 
+excluded_paths = PathMatcher([
+    '/api/v1/status/',
+    '/api/v1/unauthorized/',
+    '/api/v1/forbidden/',
+])
+for excluded_path in getenv("AUTH_EXCLUDED_PATHS", "").split(","):
+    if excluded_path.strip():
+        excluded_paths.add(excluded_path.strip())
+
 
 @app.before_request
 def before_request():
@@ -31,11 +40,6 @@ def before_request():
     if auth is None:
         return
 
-    excluded_paths = ['/api/v1/status/', '/api/v1/unauthorized/',
-                      '/api/v1/forbidden/']
-    if request.path in excluded_paths:
-        return
-
     if auth.require_auth(request.path, excluded_paths):
         auth_header = auth.authorization_header(request)
         if auth_header is None:
@@ -4,15 +4,117 @@ Basic Authentication module for the API.
 """
 from api.v1.auth.auth import Auth
 import base64
+import hashlib
+import hmac
+import threading
+import time
+from collections import OrderedDict
+from os import getenv, urandom
 from typing import Tuple, TypeVar
 from models.user import User
 
+CACHE_TTL = float(getenv("BASIC_AUTH_CACHE_TTL", "60"))
+CACHE_SIZE = int(getenv("BASIC_AUTH_CACHE_SIZE", "1024"))
+
 
 class BasicAuth(Auth):
     """
     BasicAuth class to manage basic authentication for the API.
+
+    Authorization headers that verified are cached for cache_ttl
+    seconds, keyed by an HMAC of the header under a per-process key, so
+    repeated requests skip decoding, the user lookup and the password
+    hash. An entry is dropped as soon as its user is removed or changes
+    email or password, and the least recently used entry is evicted
+    once cache_size entries are held.
     """
 
+    def __init__(self, cache_ttl: float = None, cache_size: int = None):
+        """
+        Initialize the credential cache.
+
+        :param cache_ttl: Seconds a verified header stays cached,
+        BASIC_AUTH_CACHE_TTL by default; 0 disables the cache.
+        :param cache_size: Maximum number of cached headers,
+        BASIC_AUTH_CACHE_SIZE by default.
+        """
+        super().__init__()
+        self.cache_ttl = CACHE_TTL if cache_ttl is None else cache_ttl
+        self.cache_size = CACHE_SIZE if cache_size is None else cache_size
+        self.cache_stats = {"hits": 0, "misses": 0, "evictions": 0,
+                            "invalidations": 0}
+        self._cache = OrderedDict()
+        self._cache_key = urandom(32)
+        self._cache_lock = threading.Lock()
+
+    def cache_info(self) -> dict:
+        """
+        Return the counters and current size of the credential cache.
+
+        :return: Dictionary of hits, misses, evictions, invalidations
+        and size.
+        """
+        with self._cache_lock:
+            return dict(self.cache_stats, size=len(self._cache))
+
+    def clear_cache(self):
+        """
+        Drop every cached credential.
+        """
+        with self._cache_lock:
+            self._cache.clear()
+
+    def _cache_digest(self, auth_header: str) -> bytes:
+        """
+        Compute the cache key of an Authorization header.
+
+        :param auth_header: The raw Authorization header.
+        :return: The HMAC-SHA256 of the header.
+        """
+        return hmac.new(self._cache_key, auth_header.encode(),
+                        hashlib.sha256).digest()
+
+    def _cached_user(self, digest: bytes) -> User:
+        """
+        Return the user cached for a header digest, if still valid.
+
+        :param digest: The cache key of the header.
+        :return: The User instance, or None on a miss.
+        """
+        with self._cache_lock:
+            entry = self._cache.get(digest)
+            if entry is None:
+                self.cache_stats["misses"] += 1
+                return None
+        user_id, email, password, expires = entry
+        user = User.get(user_id) if expires > time.monotonic() else None
+        with self._cache_lock:
+            if user is None or user.email != email or \
+                    user.password != password:
+                if self._cache.pop(digest, None) is not None:
+                    self.cache_stats["invalidations"] += 1
+                self.cache_stats["misses"] += 1
+                return None
+            self._cache.move_to_end(digest)
+            self.cache_stats["hits"] += 1
+        return user
+
+    def _cache_user(self, digest: bytes, user: User):
+        """
+        Cache the user a header digest verified as.
+
+        :param digest: The cache key of the header.
+        :param user: The authenticated User instance.
+        """
+        entry = (user.id, user.email, user.password,
+                 time.monotonic() + self.cache_ttl)
+        with self._cache_lock:
+            self._cache[digest] = entry
+            self._cache.move_to_end(digest)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+                self.cache_stats["evictions"] += 1
+
     def extract_base64_authorization_header(self, auth_header: str) -> str:
         """
         Extract the Base64 part of the Authorization header for Basic
@@ -109,6 +211,13 @@ class BasicAuth(Auth):
         if not authorization_header:
             return None
 
+        digest = None
+        if self.cache_ttl > 0 and self.cache_size > 0:
+            digest = self._cache_digest(authorization_header)
+            user = self._cached_user(digest)
+            if user is not None:
+                return user
+
         base64_header = self.extract_base64_authorization_header(
             authorization_header)
         if not base64_header:
@@ -122,4 +231,7 @@ class BasicAuth(Auth):
         if user_email is None or user_pwd is None:
             return None
 
-        return self.user_object_from_credentials(user_email, user_pwd)
+        user = self.user_object_from_credentials(user_email, user_pwd)
+        if user is not None and digest is not None:
+            self._cache_user(digest, user)
+        return user
@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+""" Formats module
+
+File formats of the `.db_<Class>` files: every format writes a mapping
+of object ID to JSON record, and reads it back either at once or one
+record at a time
+"""
+from itertools import repeat
+from typing import (Any, BinaryIO, Dict, IO, Iterator, List, Optional,
+                    Tuple)
+import io
+import json
+import struct
+
+
+_SIZE = struct.Struct(">I")
+_COMPACT = json.JSONEncoder(separators=(",", ":"))
+_VALUE_ENDS = frozenset(",:}] \t\r\n")
+
+
+def _iter_json_object(f: IO[str], chunk_size: int = 1 << 16
+                      ) -> Iterator[Tuple[str, Any]]:
+    """ Parse the top-level JSON object of a file incrementally, reading
+    it chunk_size characters at a time, and yield its (key, value) pairs
+    """
+    decoder = json.JSONDecoder()
+    state = {"buf": "", "pos": 0, "eof": False}
+
+    def fill() -> bool:
+        if state["eof"]:
+            return False
+        chunk = f.read(chunk_size)
+        state["buf"] = state["buf"][state["pos"]:] + chunk
+        state["pos"] = 0
+        state["eof"] = not chunk
+        return bool(chunk)
+
+    def peek() -> str:
+        while True:
+            buf, pos = state["buf"], state["pos"]
+            while pos < len(buf) and buf[pos] in " \t\r\n":
+                pos += 1
+            state["pos"] = pos
+            if pos < len(buf) or not fill():
+                return buf[pos:pos + 1]
+
+    def expect(chars: str) -> str:
+        char = peek()
+        if not char or char not in chars:
+            raise ValueError("Expecting one of {!r} at offset {}".format(
+                chars, state["pos"]))
+        state["pos"] += 1
+        return char
+
+    def decode() -> Any:
+        # a value is only complete once the character after it is read:
+        # the chunk may end inside a number, like "1" of "1.5"
+        peek()
+        while True:
+            try:
+                value, end = decoder.raw_decode(state["buf"], state["pos"])
+                if end < len(state["buf"]) and \
+                        state["buf"][end] in _VALUE_ENDS or state["eof"]:
+                    state["pos"] = end
+                    return value
+            except ValueError:
+                if state["eof"]:
+                    raise
+            fill()
+
+    expect("{")
+    if peek() == "}":
+        return
+    while True:
+        key = decode()
+        expect(":")
+        yield key, decode()
+        if expect(",}") == "}":
+            return
+
+
+class JsonFormat():
+    """ Standard library JSON, the historical format of the files
+    """
+
+    name = "json"
+    extension = ".json"
+
+    def dump(self, objs_json: Dict[str, dict], f: BinaryIO):
+        """ Write every record to a binary file
+        """
+        f.write(json.dumps(objs_json).encode())
+
+    def load(self, f: BinaryIO) -> Dict[str, dict]:
+        """ Read every record from a binary file
+        """
+        return json.loads(f.read() or b"{}")
+
+    def iter_load(self, f: BinaryIO) -> Iterator[Tuple[str, dict]]:
+        """ Read the (ID, record) pairs of a binary file incrementally
+        """
+        return _iter_json_object(io.TextIOWrapper(f, encoding="utf-8"))
+
+
+def _encode_block(keys: Tuple[str, ...], records: List[dict]) -> bytes:
+    """ Encode records sharing the same keys as the JSON array of their
+    keys followed by one column of values per key
+    """
+    columns = [[obj_json[key] for obj_json in records] for key in keys]
+    return _COMPACT.encode([list(keys)] + columns).encode()
+
+
+def _decode_block(payload: bytes) -> Iterator[dict]:
+    """ Records of a block written by _encode_block
+    """
+    try:
+        keys, *columns = json.loads(payload)
+    except (ValueError, TypeError) as e:
+        raise ValueError("Corrupted binary models block") from e
+    if type(keys) is not list or "id" not in keys or \
+            len(columns) != len(keys) or \
+            any(type(key) is not str for key in keys) or \
+            any(type(c) is not list or len(c) != len(columns[0])
+                for c in columns) or \
+            any(type(i) is not str for i in columns[keys.index("id")]):
+        raise ValueError("Corrupted binary models block")
+    return map(dict, map(zip, repeat(keys), zip(*columns)))
+
+
+class BinaryFormat():
+    """ Length-prefixed blocks of columns
+
+    The file starts with MAGIC, then holds blocks of at most BLOCK
+    records that have the same keys, each a 4-byte big-endian length
+    followed by the UTF-8 JSON array of the keys and of one column of
+    values per key. Keys are written once per block instead of once per
+    record, and a block is parsed by a single json.loads call
+    """
+
+    name = "binary"
+    extension = ".bin"
+    MAGIC = b"MDB\x03"
+    BLOCK = 1024
+
+    def dump(self, objs_json: Dict[str, dict], f: BinaryIO):
+        """ Write every record to a binary file
+        """
+        chunks = [self.MAGIC]
+        keys = None
+        records = []
+        for obj_json in objs_json.values():
+            if tuple(obj_json) != keys or len(records) >= self.BLOCK:
+                if records:
+                    payload = _encode_block(keys, records)
+                    chunks.append(_SIZE.pack(len(payload)))
+                    chunks.append(payload)
+                keys = tuple(obj_json)
+                records = []
+            records.append(obj_json)
+        if records:
+            payload = _encode_block(keys, records)
+            chunks.append(_SIZE.pack(len(payload)))
+            chunks.append(payload)
+        f.write(b"".join(chunks))
+
+    def load(self, f: BinaryIO) -> Dict[str, dict]:
+        """ Read every record from a binary file
+        """
+        return dict(self.iter_load(f))
+
+    def iter_load(self, f: BinaryIO) -> Iterator[Tuple[str, dict]]:
+        """ Read the (ID, record) pairs of a binary file one block at a
+        time
+        """
+        if f.read(len(self.MAGIC)) != self.MAGIC:
+            raise ValueError("Not a binary models file")
+        while True:
+            header = f.read(_SIZE.size)
+            if not header:
+                return
+            if len(header) < _SIZE.size:
+                raise ValueError("Truncated binary models file")
+            size = _SIZE.unpack(header)[0]
+            payload = f.read(size)
+            if len(payload) < size:
+                raise ValueError("Truncated binary models file")
+            for obj_json in _decode_block(payload):
+                yield obj_json["id"], obj_json
+
+
+FORMATS = {fmt.name: fmt for fmt in (JsonFormat(), BinaryFormat())}
+
+
+def detect(f: BinaryIO) -> Optional[Any]:
+    """ Return the format of an open binary file from its first bytes,
+    leaving the file at its start, or None if the file is empty
+    """
+    head = f.read(len(BinaryFormat.MAGIC))
+    f.seek(0)
+    if not head:
+        return None
+    if head == BinaryFormat.MAGIC:
+        return FORMATS["binary"]
+    return FORMATS["json"]
@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+""" Query module
+"""
+from bisect import bisect_left
+from heapq import nlargest, nsmallest
+from itertools import islice
+from typing import Any, Callable, Iterable, Iterator, List, Optional, Tuple
+
+from models.base import (DATA, INDEXES, _LazyObjects, _Record,
+                         _parse_timestamp)
+
+
+OPERATORS = ('eq', 'in', 'prefix', 'gt', 'gte', 'lt', 'lte')
+TIMESTAMP_ATTRIBUTES = ('created_at', 'updated_at')
+
+
+def _timestamp(value: Any) -> Any:
+    """ Datetime of an ISO 8601 string, other values unchanged
+    """
+    if isinstance(value, str):
+        return _parse_timestamp(value)
+    return value
+
+
+def _predicate(op: str, operand: Any) -> Callable[[Any], bool]:
+    """ Test of an attribute value against the operand of a condition
+    """
+    if op == 'eq':
+        return lambda v: v == operand
+    if op == 'in':
+        return lambda v: v in operand
+    if op == 'prefix':
+        return lambda v: isinstance(v, str) and v.startswith(operand)
+    compare = {
+        'gt': lambda v: v > operand,
+        'gte': lambda v: v >= operand,
+        'lt': lambda v: v < operand,
+        'lte': lambda v: v <= operand,
+    }[op]
+
+    def test(v):
+        try:
+            return v is not None and compare(v)
+        except TypeError:
+            return False
+    return test
+
+
+def _raw_matches(raw: _Record, tests: List[Tuple[str, Callable]]
+                 ) -> Optional[bool]:
+    """ Whether a raw record passes every (attribute, predicate) test, or
+    None if only the object itself can tell
+    """
+    for attribute, test in tests:
+        if attribute not in raw.positions:
+            return None
+        value = raw.get(attribute)
+        if attribute in TIMESTAMP_ATTRIBUTES:
+            value = _timestamp(value)
+        if not test(value):
+            return False
+    return True
+
+
+class Query():
+    """ Query over the objects of a model class
+
+    Conditions are ANDed; `filter` takes them as keyword arguments,
+    `attribute=value` for equality or `attribute__<op>=value` with op
+    one of `in`, `prefix`, `gt`, `gte`, `lt` and `lte`. Range operands
+    on `created_at` and `updated_at` may be datetimes or ISO strings.
+
+    Running the query starts from the smallest secondary index match of
+    an `eq`, `in` or `prefix` condition when one applies, a prefix being
+    looked up by bisecting the sorted values of the index, and otherwise
+    from every object. Without `order_by`, or ordered by `id`, it stops
+    as soon as `offset + limit` objects matched; ordering by another
+    attribute keeps only the best `offset + limit` matches in a heap.
+    In lazy mode raw records are tested before objects are built.
+    """
+
+    def __init__(self, cls: type):
+        """ Initialize a query matching every object of cls
+        """
+        self.cls = cls
+        self.conditions: List[Tuple[str, str, Any]] = []
+        self.ordering: Optional[Tuple[str, bool]] = None
+        self.max_results: Optional[int] = None
+        self.skip = 0
+
+    def where(self, attribute: str, op: str, operand: Any) -> 'Query':
+        """ Add the condition `attribute <op> operand`
+        """
+        if op not in OPERATORS:
+            raise ValueError("op must be one of {}".format(OPERATORS))
+        if attribute in TIMESTAMP_ATTRIBUTES:
+            if op == 'in':
+                operand = [_timestamp(v) for v in operand]
+            elif op != 'prefix':
+                operand = _timestamp(operand)
+        if op == 'in':
+            operand = list(operand)
+        self.conditions.append((attribute, op, operand))
+        return self
+
+    def filter(self, **conditions: Any) -> 'Query':
+        """ Add conditions given as `attribute` or `attribute__<op>`
+        keyword arguments
+        """
+        for key, operand in conditions.items():
+            attribute, _, op = key.partition('__')
+            self.where(attribute, op or 'eq', operand)
+        return self
+
+    def order_by(self, attribute: str) -> 'Query':
+        """ Sort the results on attribute, descending if it starts with
+        `-`; objects missing the attribute come last
+        """
+        self.ordering = (attribute.lstrip('-'), attribute.startswith('-'))
+        return self
+
+    def limit(self, max_results: Optional[int]) -> 'Query':
+        """ Return at most max_results objects
+        """
+        self.max_results = max_results
+        return self
+
+    def offset(self, skip: int) -> 'Query':
+        """ Skip the first `skip` results
+        """
+        self.skip = skip
+        return self
+
+    def _candidates(self) -> Optional[Iterable[str]]:
+        """ IDs of the smallest index match of the conditions, or None if
+        no index applies
+        """
+        indexes = INDEXES.get(self.cls.__name__, {})
+        best = None
+        for attribute, op, operand in self.conditions:
+            index = indexes.get(attribute)
+            if index is None or op not in ('eq', 'in', 'prefix'):
+                continue
+            try:
+                if op == 'eq':
+                    ids = index.get(operand, {})
+                elif op == 'in':
+                    ids = {}
+                    for value in operand:
+                        ids.update(index.get(value, {}))
+                else:
+                    ids = {}
+                    keys = self.cls._index_keys(attribute)
+                    for i in range(bisect_left(keys, operand), len(keys)):
+                        if not keys[i].startswith(operand):
+                            break
+                        ids.update(index[keys[i]])
+            except TypeError:
+                continue
+            if best is None or len(ids) < len(best):
+                best = ids
+        return best
+
+    def _ids(self) -> Iterable[str]:
+        """ IDs to test, in ID order when the query is ordered by ID
+        """
+        candidates = self._candidates()
+        if self.ordering is None or self.ordering[0] != 'id':
+            if candidates is None:
+                return list(DATA[self.cls.__name__])
+            return list(candidates)
+        reverse = self.ordering[1]
+        if candidates is not None:
+            return sorted(candidates, reverse=reverse)
+        ids = self.cls._sorted_ids()
+        return reversed(ids) if reverse else list(ids)
+
+    def _matches(self) -> Iterator[Any]:
+        """ Iterate over the objects matching every condition
+        """
+        store = DATA[self.cls.__name__]
+        lazy = isinstance(store, _LazyObjects)
+        tests = [(a, _predicate(op, v)) for a, op, v in self.conditions]
+        for obj_id in self._ids():
+            value = dict.get(store, obj_id)
+            if value is None:
+                continue
+            if lazy and isinstance(value, _Record):
+                matched = _raw_matches(value, tests)
+                if matched is False:
+                    continue
+                value = store._materialize(obj_id, value)
+                if matched:
+                    yield value
+                    continue
+            if all(test(getattr(value, a)) for a, test in tests):
+                yield value
+
+    def all(self) -> List[Any]:
+        """ Return the matching objects
+        """
+        self.cls._sync()
+        with self.cls._rwlock().read():
+            return self._run()
+
+    def _run(self) -> List[Any]:
+        """ Return the matching objects, holding the read lock
+        """
+        matches = self._matches()
+        end = None
+        if self.max_results is not None:
+            end = self.skip + self.max_results
+        if self.ordering is not None and self.ordering[0] != 'id':
+            attribute, reverse = self.ordering
+
+            def key(obj):
+                value = getattr(obj, attribute, None)
+                if value is None:
+                    return (not reverse,)
+                return (reverse, value)
+
+            if end is None:
+                matches = sorted(matches, key=key, reverse=reverse)
+            elif reverse:
+                matches = nlargest(end, matches, key=key)
+            else:
+                matches = nsmallest(end, matches, key=key)
+        return list(islice(matches, self.skip, end))
+
+    def first(self) -> Optional[Any]:
+        """ Return the first matching object, or None
+        """
+        max_results, self.max_results = self.max_results, 1
+        try:
+            results = self.all()
+        finally:
+            self.max_results = max_results
+        return results[0] if results else None
+
+    def __iter__(self) -> Iterator[Any]:
+        """ Iterate over the matching objects
+        """
+        return iter(self.all())
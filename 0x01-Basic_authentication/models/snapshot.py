@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+""" Snapshot module
+
+Binary images of the objects of a class: a header holding a magic
+number, the image version and the SHA-256 of the payload, followed by
+the payload, a JSON document holding the attributes of the objects one
+column per attribute. Reading an image never runs code from the file,
+and the checksum only detects corruption
+"""
+from datetime import datetime
+from itertools import repeat
+from typing import Any, BinaryIO, Dict, Tuple
+import hashlib
+import json
+import struct
+
+
+MAGIC = b"MSN\x01"
+VERSION = 2
+HEADER = struct.Struct(">4sI32s")
+_UNSET = object()
+
+
+class SnapshotError(ValueError):
+    """ Image that cannot be restored: truncated, corrupted, or written
+    by another version
+    """
+
+
+def dump(description: Dict[str, Any], objects: Dict[str, Any],
+         f: BinaryIO):
+    """ Write an image of objects to a binary file object
+
+    description is any JSON-serializable dict; objects maps IDs to
+    objects, whose attributes are taken from their _state(), or to raw
+    records. Datetime attributes are stored in ISO 8601
+    """
+    built = []
+    records = []
+    for value in objects.values():
+        if type(value) is dict:
+            records.append(value)
+        else:
+            built.append(value._state())
+    columns = {}
+    unset = {}
+    datetimes = {}
+    for key in {key for state in built for key in state}:
+        column = [state.get(key, _UNSET) for state in built]
+        missing = [i for i, v in enumerate(column) if v is _UNSET]
+        if missing:
+            unset[key] = missing
+        dated = [i for i, v in enumerate(column) if type(v) is datetime]
+        if len(dated) == len(column):
+            datetimes[key] = "all"
+        elif dated:
+            datetimes[key] = dated
+        columns[key] = [v.isoformat() if type(v) is datetime else
+                        None if v is _UNSET else v for v in column]
+    data = json.dumps({"description": description, "count": len(built),
+                       "columns": columns, "unset": unset,
+                       "datetimes": datetimes,
+                       "records": records}).encode()
+    f.write(HEADER.pack(MAGIC, VERSION, hashlib.sha256(data).digest()))
+    f.write(data)
+
+
+def _build(cls: type, fields: Tuple[str, ...], payload: dict) -> list:
+    """ Objects of cls rebuilt from the columns of an image, without
+    running __init__, setting their slots in bulk
+    """
+    count = payload["count"]
+    objs = list(map(cls.__new__, repeat(cls, count)))
+    for key, column in payload["columns"].items():
+        if key not in fields or len(column) != count:
+            raise SnapshotError("unexpected attribute {!r}".format(key))
+        dated = payload["datetimes"].get(key)
+        if dated == "all":
+            column = list(map(datetime.fromisoformat, column))
+        elif dated:
+            for i in dated:
+                column[i] = datetime.fromisoformat(column[i])
+        list(map(getattr(cls, key).__set__, objs, column))
+        for i in payload["unset"].get(key, ()):
+            delattr(objs[i], key)
+    if objs:
+        list(map(object.__setattr__, objs, repeat('_json_cache'),
+                 repeat(None)))
+    return objs
+
+
+def load(f: BinaryIO, cls: type, fields: Tuple[str, ...]
+         ) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """ Read back the description and the objects of an image from a
+    binary file object, raising SnapshotError if it does not check out
+
+    Objects are rebuilt as instances of cls, whose slots must include
+    every stored attribute; raw records are returned as dicts
+    """
+    header = f.read(HEADER.size)
+    if len(header) != HEADER.size:
+        raise SnapshotError("truncated header")
+    magic, version, digest = HEADER.unpack(header)
+    if magic != MAGIC:
+        raise SnapshotError("not a snapshot")
+    if version != VERSION:
+        raise SnapshotError("snapshot version {} != {}".format(version,
+                                                               VERSION))
+    data = f.read()
+    if hashlib.sha256(data).digest() != digest:
+        raise SnapshotError("checksum mismatch")
+    try:
+        payload = json.loads(data)
+        objects = {obj.id: obj for obj in _build(cls, fields, payload)}
+        for record in payload["records"]:
+            objects[record["id"]] = record
+        return payload["description"], objects
+    except SnapshotError:
+        raise
+    except (ValueError, KeyError, TypeError, AttributeError,
+            IndexError) as e:
+        raise SnapshotError("corrupted image: {}".format(e)) from e
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+""" Main auth cache
+
+BasicAuth credential cache: hits, and entries dropped on expiry,
+eviction, and any change to their user
+"""
+import base64
+import time
+
+from storage_checks import main, run
+from api.v1.auth.basic_auth import BasicAuth
+from models.user import User
+
+
+class Request():
+    """ Request carrying an Authorization header
+    """
+
+    def __init__(self, email: str, pwd: str):
+        """ Initialize the request with Basic credentials
+        """
+        credentials = "{}:{}".format(email, pwd).encode()
+        self.headers = {"Authorization": "Basic {}".format(
+            base64.b64encode(credentials).decode())}
+
+
+def create_user(email: str, pwd: str) -> User:
+    """ Save a user with this email and password
+    """
+    user = User(email=email)
+    user.password = pwd
+    user.save()
+    return user
+
+
+def check_cache():
+    """ A verified header is served from the cache until it expires, is
+    evicted, or its user changes
+    """
+    User.load_from_file()
+    bob = create_user("bob@hbtn.io", "H0lberton:School:98!")
+    auth = BasicAuth(cache_ttl=60, cache_size=2)
+    request = Request("bob@hbtn.io", "H0lberton:School:98!")
+    assert auth.current_user(request) == bob
+    assert auth.current_user(request) == bob
+    assert auth.cache_info()["hits"] == 1 and auth.cache_info()["size"] == 1
+    assert auth.current_user(Request("bob@hbtn.io", "wrong")) is None
+    assert auth.current_user(Request("bob@hbtn.io", "wrong")) is None
+    assert auth.cache_info()["size"] == 1
+    assert auth.current_user(None) is None
+    for header in ("Bearer x", "Basic !!!", "Basic " + "Ym9i"):
+        request_ = Request("", "")
+        request_.headers["Authorization"] = header
+        assert auth.current_user(request_) is None
+
+    bob.password = "new"
+    bob.save()
+    assert auth.current_user(request) is None
+    assert auth.cache_info()["invalidations"] == 1
+    assert auth.current_user(Request("bob@hbtn.io", "new")) == bob
+
+    users = [create_user("u{}@hbtn.io".format(i), "pwd") for i in range(3)]
+    for user in users:
+        assert auth.current_user(Request(user.email, "pwd")) == user
+    info = auth.cache_info()
+    assert info["size"] == 2 and info["evictions"] == 2, info
+    users[2].remove()
+    assert auth.current_user(Request(users[2].email, "pwd")) is None
+
+    short = BasicAuth(cache_ttl=0.05)
+    user = users[1]
+    assert short.current_user(Request(user.email, "pwd")) == user
+    time.sleep(0.1)
+    assert short.current_user(Request(user.email, "pwd")) == user
+    assert short.cache_info()["hits"] == 0
+
+    off = BasicAuth(cache_ttl=0)
+    off.current_user(Request(user.email, "pwd"))
+    assert off.current_user(Request(user.email, "pwd")) == user
+    assert off.cache_info()["size"] == 0
+
+
+def check_password_changer():
+    """ Change the password of bob, for check_shared_cache
+    """
+    User.load_from_file()
+    bob = User.search({"email": "bob@hbtn.io"})[0]
+    bob.password = "changed"
+    bob.save()
+
+
+def check_shared_cache():
+    """ A password changed by another process invalidates the cache
+    """
+    User.load_from_file()
+    bob = create_user("bob@hbtn.io", "pwd")
+    auth = BasicAuth(cache_ttl=60)
+    assert auth.current_user(Request("bob@hbtn.io", "pwd")) == bob
+    run("password_changer")
+    assert auth.current_user(Request("bob@hbtn.io", "pwd")) is None
+    assert auth.current_user(Request("bob@hbtn.io", "changed")).id == bob.id
+
+
+CHECKS = [
+    ("cache", {}),
+    ("shared_cache", {"MODELS_SHARED": "1"}),
+]
+
+
+if __name__ == "__main__":
+    main(CHECKS, globals())
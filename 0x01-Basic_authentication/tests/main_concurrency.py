@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+""" Main concurrency
+
+Threads saving and searching users at the same time
+"""
+import threading
+
+from storage_checks import main, save_users
+from models.user import User
+
+
+def check_concurrent_access():
+    """ Threads saving and searching users at the same time neither fail
+    nor lose a write
+    """
+    User.load_from_file()
+    users = save_users(*("user{}@hbtn.io".format(i) for i in range(200)))
+    errors = []
+    stop = threading.Event()
+
+    def write(k):
+        try:
+            for i in range(50):
+                User(email="t{}-{}@hbtn.io".format(k, i)).save()
+                users[(k * 50 + i) % len(users)].save()
+        except Exception as e:
+            errors.append(e)
+
+    def read():
+        try:
+            while not stop.is_set():
+                assert len(User.search({"email": "user7@hbtn.io"})) == 1
+                User.query(email__prefix="t1-").all()
+                assert User.count() >= 200
+                User.page(50)
+        except Exception as e:
+            errors.append(e)
+
+    writers = [threading.Thread(target=write, args=(k,)) for k in range(4)]
+    readers = [threading.Thread(target=read) for _ in range(4)]
+    for thread in writers + readers:
+        thread.start()
+    for thread in writers:
+        thread.join()
+    stop.set()
+    for thread in readers:
+        thread.join()
+    assert not errors, errors
+    assert User.count() == 400
+    for k in range(4):
+        assert len(User.query(email__prefix="t{}-".format(k)).all()) == 50
+    User.load_from_file()
+    assert User.count() == 400
+
+
+CHECKS = [
+    ("concurrent_access", {}),
+    ("concurrent_access", {"MODELS_STORAGE": "journal",
+                           "MODELS_SHARDS": "4"}),
+    ("concurrent_access", {"MODELS_SHARED": "1"}),
+]
+
+
+if __name__ == "__main__":
+    main(CHECKS, globals())
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+""" Main formats
+
+File formats: records read back as written, corrupted binary files
+rejected, and files migrated between formats
+"""
+import io
+import os
+import random
+import subprocess
+import sys
+
+from storage_checks import emails, main, run, save_users
+from models.formats import FORMATS, detect
+from models.user import User
+
+
+RECORDS = {
+    "a": {"id": "a", "email": "é@hbtn.io", "n": None, "x": [1.5, {"k": 2}]},
+    "b": {"id": "b", "email": "b@hbtn.io", "n": 3, "x": []},
+    "c": {"id": "c", "n": "", "extra": True},
+}
+
+
+def check_round_trip():
+    """ Every format reads back what it wrote, at once or record by
+    record, and is detected from the first bytes of its files
+    """
+    records = dict(RECORDS)
+    for i in range(3000):
+        records[str(i)] = {"id": str(i), "email": "{}@hbtn.io".format(i)}
+    for fmt in FORMATS.values():
+        for objs in ({}, RECORDS, records):
+            f = io.BytesIO()
+            fmt.dump(objs, f)
+            data = f.getvalue()
+            assert fmt.load(io.BytesIO(data)) == objs, fmt.name
+            assert list(fmt.iter_load(io.BytesIO(data))) == \
+                list(objs.items()), fmt.name
+            assert not data or detect(io.BytesIO(data)) is fmt
+
+
+def check_corrupted_binary():
+    """ A damaged binary file raises ValueError
+    """
+    fmt = FORMATS["binary"]
+    f = io.BytesIO()
+    fmt.dump(RECORDS, f)
+    data = f.getvalue()
+    rng = random.Random(0)
+    for _ in range(2000):
+        damaged = bytearray(data)
+        for _ in range(rng.randint(1, 3)):
+            damaged[rng.randrange(len(damaged))] = rng.randrange(256)
+        if rng.random() < 0.3:
+            damaged = damaged[:rng.randrange(len(damaged))]
+        try:
+            list(fmt.iter_load(io.BytesIO(bytes(damaged))))
+        except ValueError:
+            pass
+
+
+def check_users_writer():
+    """ Save users, in the format of MODELS_FORMAT
+    """
+    User.load_from_file()
+    save_users(*("user{}@hbtn.io".format(i) for i in range(100)))
+
+
+def check_users_load():
+    """ Print how many users load, and the extensions of the files
+    """
+    User.load_from_file()
+    assert len(emails()) == 100
+    assert User.search({"email": "user7@hbtn.io"})[0].is_valid_password(
+        "pwd")
+    extensions = {os.path.splitext(name)[1] for name in os.listdir(".")}
+    print(User.count(), " ".join(sorted(extensions)))
+
+
+def check_migration():
+    """ Files are read whatever their format, and migrate_format rewrites
+    them in another one
+    """
+    run("users_writer", MODELS_FORMAT="binary")
+    assert run("users_load").split() == ["100", ".bin"]
+    assert run("users_load", MODELS_LAZY_LOAD="1").split() == \
+        ["100", ".bin"]
+    subprocess.run([sys.executable, "-m", "models.migrate_format", "json"],
+                   check=True, stdout=subprocess.DEVNULL,
+                   env=dict(os.environ, PYTHONPATH=os.path.dirname(
+                       os.path.dirname(os.path.abspath(__file__)))))
+    assert run("users_load", MODELS_FORMAT="binary").split() == \
+        ["100", ".json"]
+
+
+CHECKS = [
+    ("round_trip", {}),
+    ("corrupted_binary", {}),
+    ("migration", {}),
+    ("migration", {"MODELS_SHARDS": "3"}),
+]
+
+
+if __name__ == "__main__":
+    main(CHECKS, globals())
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+""" Main indexes
+
+Secondary indexes: search on an indexed attribute finds what a scan of
+every user finds, through saves, changes, removals and reloads
+"""
+import random
+
+from storage_checks import main
+from models import base
+from models.user import User
+
+
+def check_consistent(emails: list):
+    """ Search by email and by the other attributes matches a scan
+    """
+    users = User.all()
+    for email in emails:
+        expected = sorted(u.id for u in users if u.email == email)
+        found = sorted(u.id for u in User.search({"email": email}))
+        assert found == expected, (email, found, expected)
+    expected = sorted(u.id for u in users
+                      if u.email is None and u.first_name == "x")
+    found = sorted(u.id for u in User.search({"email": None,
+                                              "first_name": "x"}))
+    assert found == expected
+    index = base.INDEXES["User"]["email"]
+    assert sum(len(ids) for ids in index.values()) == len(users)
+
+
+def check_indexes():
+    """ The email index follows every change to the users
+    """
+    rng = random.Random(0)
+    emails = ["{}@hbtn.io".format(i) for i in range(20)] + [None]
+    User.load_from_file()
+    for _ in range(600):
+        users = User.all()
+        action = rng.random()
+        if action < 0.4 or not users:
+            User(email=rng.choice(emails), first_name="x").save()
+        elif action < 0.8:
+            user = rng.choice(users)
+            user.email = rng.choice(emails)
+            user.save()
+        else:
+            rng.choice(users).remove()
+    check_consistent(emails)
+    User.load_from_file()
+    check_consistent(emails)
+
+
+CHECKS = [
+    ("indexes", {}),
+    ("indexes", {"MODELS_STORAGE": "journal"}),
+    ("indexes", {"MODELS_LAZY_LOAD": "1"}),
+]
+
+
+if __name__ == "__main__":
+    main(CHECKS, globals())
@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+""" Main journal
+
+Journal storage: replay after a torn line, and compaction
+"""
+import os
+
+from storage_checks import emails, main, save_users
+from models.user import User
+
+
+def check_journal_torn_line():
+    """ A record cut short by a crash is dropped on replay and does not
+    corrupt the next append
+    """
+    User.load_from_file()
+    save_users("a@hbtn.io")
+    with open(".db_User.journal", "ab") as f:
+        f.write(b'{"op": "put", "obj": {"id": "torn')
+    User.load_from_file()
+    assert emails() == ["a@hbtn.io"], emails()
+    User(email="b@hbtn.io").save()
+    with open(".db_User.journal", "ab") as f:
+        f.write(b'not json\n')
+    User(email="c@hbtn.io").save()
+    User.load_from_file()
+    assert emails() == ["a@hbtn.io", "b@hbtn.io", "c@hbtn.io"], emails()
+
+
+def check_journal_compaction():
+    """ Compacting folds the journal into the file
+    """
+    User.load_from_file()
+    save_users("a@hbtn.io", "b@hbtn.io")
+    User.search({"email": "a@hbtn.io"})[0].remove()
+    assert os.path.exists(".db_User.journal")
+    User.compact()
+    assert not os.path.exists(".db_User.journal")
+    User.load_from_file()
+    assert emails() == ["b@hbtn.io"], emails()
+
+
+CHECKS = [
+    ("journal_torn_line", {"MODELS_STORAGE": "journal"}),
+    ("journal_compaction", {"MODELS_STORAGE": "journal"}),
+]
+
+
+if __name__ == "__main__":
+    main(CHECKS, globals())
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+""" Main lazy
+
+Lazy load: the streaming JSON parser, and objects built on first access
+"""
+import io
+import json
+import random
+
+from storage_checks import main, run, save_users
+from models import base
+from models.formats import _iter_json_object
+from models.user import User
+
+
+DOCUMENTS = [
+    '{}',
+    ' { } ',
+    '{"a": -3, "b": 1.5}',
+    '{"x": 1e-7, "y": [1, 2.25, {"z": "}\\"]:,"}], "e": 6.02E+23}',
+    '{"t": true, "f": false, "n": null, "s": "", "l": [], "o": {}}',
+    '{ "k" : 12345678901234567890 , "u": "\\u00e9\\ud83d\\ude00è" }',
+    '{"n": -0.0, "m": 0, "big": 1.7976931348623157e308}',
+]
+
+
+def random_document(rng: random.Random) -> str:
+    """ JSON object of random numbers, strings and nested values
+    """
+    def value(depth):
+        kind = rng.randrange(6 if depth < 3 else 4)
+        if kind == 0:
+            return rng.randint(-10 ** 6, 10 ** 6)
+        if kind == 1:
+            return rng.uniform(-1e6, 1e6) * 10 ** rng.randint(-30, 30)
+        if kind == 2:
+            return "".join(rng.choice('ab"\\{},:] é') for _ in range(5))
+        if kind == 3:
+            return rng.choice([True, False, None])
+        if kind == 4:
+            return [value(depth + 1) for _ in range(rng.randrange(4))]
+        return {str(i): value(depth + 1) for i in range(rng.randrange(4))}
+
+    document = {"k{}".format(i): value(0) for i in range(20)}
+    return json.dumps(document, indent=rng.choice([None, 1]))
+
+
+def check_parser():
+    """ The streaming parser reads what json.loads reads, wherever the
+    chunks end
+    """
+    rng = random.Random(0)
+    documents = DOCUMENTS + [random_document(rng) for _ in range(50)]
+    for document in documents:
+        expected = json.loads(document)
+        for chunk_size in (1, 2, 3, 5, 7, 16, 1 << 16):
+            f = io.StringIO(document)
+            parsed = dict(_iter_json_object(f, chunk_size))
+            assert parsed == expected, (document, chunk_size, parsed)
+    for document in ('{"a": 1', '{"a": 1.5x}', '{"a" 1}', '[1]'):
+        for chunk_size in (1, 4, 1 << 16):
+            try:
+                dict(_iter_json_object(io.StringIO(document), chunk_size))
+            except ValueError:
+                continue
+            raise AssertionError("{!r} parsed".format(document))
+
+
+def check_lazy_writer():
+    """ Save users to file, then change one of them, which goes to the
+    journal in journal mode
+    """
+    User.load_from_file()
+    users = save_users(*("user{}@hbtn.io".format(i) for i in range(300)))
+    User.save_to_file()
+    users[0].first_name = "Bob"
+    users[0].save()
+
+
+def check_eager_dump():
+    """ Print the users as loaded without lazy mode
+    """
+    User.load_from_file()
+    print(json.dumps({u.id: u.to_json(True) for u in User.all()}))
+
+
+def check_lazy_load():
+    """ Users stay compact records until get or search returns them, and
+    are written back unchanged
+    """
+    run("lazy_writer", MODELS_LAZY_LOAD="0")
+    stored = json.loads(run("eager_dump", MODELS_LAZY_LOAD="0"))
+    User.load_from_file()
+    store = base.DATA["User"]
+    assert all(isinstance(v, base._Record) for v in dict.values(store))
+    user = User.search({"email": "user7@hbtn.io"})[0]
+    assert user.is_valid_password("pwd")
+    assert dict.get(store, user.id) is user
+    assert User.search({"first_name": "Bob"})[0].email == "user0@hbtn.io"
+    assert len(User.query(email__prefix="user1").all()) == 111
+    assert sum(isinstance(v, User) for v in dict.values(store)) == 113
+    User.save_to_file()
+    assert json.loads(run("eager_dump", MODELS_LAZY_LOAD="0")) == stored
+    assert User.count() == 300 and len(User.all()) == 300
+
+
+CHECKS = [
+    ("parser", {}),
+    ("lazy_load", {"MODELS_LAZY_LOAD": "1"}),
+    ("lazy_load", {"MODELS_LAZY_LOAD": "1", "MODELS_STORAGE": "journal"}),
+]
+
+
+if __name__ == "__main__":
+    main(CHECKS, globals())
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+""" Main pagination
+
+User.page and GET /api/v1/users: pages and streams list every user once,
+in ID order, while users are added and removed between pages
+"""
+import json
+
+from storage_checks import main, save_users
+from models.user import User
+
+
+def check_page():
+    """ Following the pages lists every user once, in ID order
+    """
+    User.load_from_file()
+    save_users(*("user{}@hbtn.io".format(i) for i in range(103)))
+    ids = sorted(u.id for u in User.all())
+    for limit in (1, 10, 103, 500):
+        seen, after = [], None
+        while True:
+            users, after = User.page(limit, after)
+            assert len(users) <= limit
+            seen += [u.id for u in users]
+            if after is None:
+                break
+        assert seen == ids, limit
+    users, after = User.page(10, ids[-1])
+    assert users == [] and after is None
+
+    users, after = User.page(10)
+    removed = User.get(ids[10])
+    removed.remove()
+    users, after = User.page(10, after)
+    assert [u.id for u in users] == ids[11:21]
+    users[0].remove()
+    users, after = User.page(10, after)
+    assert [u.id for u in users] == ids[21:31]
+
+
+def check_users_view():
+    """ GET /api/v1/users with limit, cursor and stream
+    """
+    from api.v1.app import app
+    User.load_from_file()
+    save_users(*("user{}@hbtn.io".format(i) for i in range(25)))
+    ids = sorted(u.id for u in User.all())
+    client = app.test_client()
+
+    everyone = client.get("/api/v1/users").get_json()
+    assert sorted(u["id"] for u in everyone) == ids
+    streamed = client.get("/api/v1/users?stream=1")
+    assert streamed.mimetype == "application/json"
+    assert sorted(u["id"] for u in json.loads(streamed.data)) == ids
+
+    seen, url = [], "/api/v1/users?limit=10"
+    while True:
+        response = client.get(url)
+        assert response.status_code == 200
+        body = response.get_json()
+        seen += [u["id"] for u in body["users"]]
+        if body["next_cursor"] is None:
+            assert "Link" not in response.headers
+            break
+        assert 'rel="next"' in response.headers["Link"]
+        url = "/api/v1/users?limit=10&cursor={}".format(body["next_cursor"])
+    assert seen == ids
+    assert len(client.get("/api/v1/users?cursor=").get_json()["users"]) == 25
+
+    for query in ("limit=0", "limit=1001", "limit=x", "cursor=%21%21"):
+        response = client.get("/api/v1/users?" + query)
+        assert response.status_code == 400, query
+
+
+CHECKS = [
+    ("page", {}),
+    ("page", {"MODELS_LAZY_LOAD": "1"}),
+    ("users_view", {}),
+]
+
+
+if __name__ == "__main__":
+    main(CHECKS, globals())
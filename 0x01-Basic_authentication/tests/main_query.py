@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+""" Main query
+
+Query planner: the results of random queries match a scan of every user
+"""
+import random
+from datetime import datetime, timedelta
+
+from storage_checks import main
+from models.base import Base
+from models.user import User
+
+
+START = datetime(2020, 1, 1)
+NAMES = ["Bob", "Bobby", "Alice", "Al", "", None]
+
+
+def create_users(rng: random.Random):
+    """ Save users with shared name prefixes and distinct dates
+    """
+    with Base.batch():
+        for i in range(500):
+            user = User(email="{}{}@hbtn.io".format(
+                rng.choice(["al", "alb", "b", "bo"]), i),
+                first_name=rng.choice(NAMES),
+                created_at=(START + timedelta(minutes=7 * i)).isoformat())
+            user.save()
+
+
+def random_condition(rng: random.Random):
+    """ (attribute, op, operand, test) of a random condition, test being
+    what the condition means for a value that is not None
+    """
+    kind = rng.randrange(7)
+    if kind == 0:
+        email = rng.choice(User.all()).email
+        return "email", "eq", email, lambda v: v == email
+    if kind == 1:
+        emails = [u.email for u in rng.sample(User.all(), 3)] + ["x@y"]
+        return "email", "in", emails, lambda v: v in emails
+    if kind == 2:
+        prefix = rng.choice(["a", "al", "alb", "b", "bo1", "z", ""])
+        return "email", "prefix", prefix, lambda v: v.startswith(prefix)
+    if kind == 3:
+        name = rng.choice(NAMES[:-1])
+        return "first_name", "eq", name, lambda v: v == name
+    if kind == 4:
+        prefix = rng.choice(["Bo", "Al", "B"])
+        return "first_name", "prefix", prefix, lambda v: v.startswith(prefix)
+    bound = START + timedelta(minutes=rng.randrange(3500))
+    operand = bound.isoformat() if rng.random() < 0.5 else bound
+    if kind == 5:
+        return "created_at", "gte", operand, lambda v: v >= bound
+    return "created_at", "lt", operand, lambda v: v < bound
+
+
+def check_query_planner():
+    """ Conditions, ordering, limit and offset give the same users as
+    filtering, sorting and slicing all of them
+    """
+    rng = random.Random(0)
+    create_users(rng)
+    User.load_from_file()
+    for _ in range(400):
+        query = User.query()
+        tests = []
+        for _ in range(rng.randrange(1, 3)):
+            attribute, op, operand, test = random_condition(rng)
+            query.where(attribute, op, operand)
+            tests.append((attribute, test))
+        expected = [u for u in User.all()
+                    if all(getattr(u, a) is not None and test(getattr(u, a))
+                           for a, test in tests)]
+        ordering = rng.choice([None, "id", "-id", "created_at", "-email"])
+        limit = rng.choice([None, 1, 10])
+        skip = rng.choice([0, 0, 3])
+        if ordering is not None:
+            query.order_by(ordering)
+            attribute = ordering.lstrip("-")
+            expected.sort(key=lambda u: getattr(u, attribute),
+                          reverse=ordering.startswith("-"))
+        query.limit(limit).offset(skip)
+        results = query.all()
+        if ordering is None:
+            assert len(results) == len(expected[skip:][:limit])
+            assert {u.id for u in results} <= {u.id for u in expected}
+        else:
+            end = None if limit is None else skip + limit
+            assert results == expected[skip:end], (query.conditions,
+                                                   ordering, limit, skip)
+    assert User.query(email__prefix="al").first().email.startswith("al")
+    assert User.query(first_name="Zed").first() is None
+
+
+CHECKS = [
+    ("query_planner", {}),
+    ("query_planner", {"MODELS_LAZY_LOAD": "1"}),
+]
+
+
+if __name__ == "__main__":
+    main(CHECKS, globals())
@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+""" Main shards
+
+Sharded storage: files written with one number of shards are read and
+rewritten with another
+"""
+import os
+
+from storage_checks import main, run, save_users
+from models import base
+from models.user import User
+
+
+def check_shard_writer():
+    """ Load the users, save one more and print how many there are
+    """
+    User.load_from_file()
+    if User.count() == 0:
+        save_users(*("user{}@hbtn.io".format(i) for i in range(100)))
+    else:
+        User(email="{}@hbtn.io".format(base.SHARDS)).save()
+    assert len(User.search({"email": "user7@hbtn.io"})) == 1
+    print(User.count())
+
+
+def check_shard_layout():
+    """ Every user is kept when the number of shards changes, and only
+    the files of the configured layout are left
+    """
+    assert run("shard_writer", MODELS_SHARDS="4").split() == ["100"]
+    assert sorted(os.listdir(".")) == [
+        ".db_User.{}.json".format(k) for k in range(4)]
+    assert run("shard_writer", MODELS_SHARDS="1").split() == ["101"]
+    assert sorted(os.listdir(".")) == [".db_User.json"]
+    assert run("shard_writer", MODELS_SHARDS="3").split() == ["102"]
+    assert sorted(os.listdir(".")) == [
+        ".db_User.{}.json".format(k) for k in range(3)]
+    assert run("shard_writer", MODELS_SHARDS="3").split() == ["103"]
+
+
+CHECKS = [
+    ("shard_layout", {}),
+]
+
+
+if __name__ == "__main__":
+    main(CHECKS, globals())
@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+""" Main shared
+
+Shared mode: changes made by other processes are picked up on access
+"""
+from storage_checks import emails, main, run, save_users
+from models.user import User
+
+
+def check_shared_writer():
+    """ Save one user, for check_shared_mode
+    """
+    User.load_from_file()
+    user = User(email="other@hbtn.io")
+    user.save()
+    print(user.id)
+
+
+def check_shared_remover():
+    """ Remove the user saved by check_shared_writer
+    """
+    User.load_from_file()
+    User.search({"email": "other@hbtn.io"})[0].remove()
+
+
+def check_shared_mode():
+    """ A user saved or removed by another process is seen by get and
+    search without reloading
+    """
+    User.load_from_file()
+    save_users("mine@hbtn.io")
+    user_id = run("shared_writer")
+    user = User.get(user_id)
+    assert user is not None and user.email == "other@hbtn.io"
+    assert User.search({"email": "other@hbtn.io"}) == [user]
+    assert User.count() == 2
+    User(email="again@hbtn.io").save()
+    User.load_from_file()
+    assert emails() == ["again@hbtn.io", "mine@hbtn.io", "other@hbtn.io"]
+    run("shared_remover")
+    assert User.get(user_id) is None
+    assert User.search({"email": "other@hbtn.io"}) == []
+    assert emails() == ["again@hbtn.io", "mine@hbtn.io"], emails()
+
+
+CHECKS = [
+    ("shared_mode", {"MODELS_SHARED": "1"}),
+    ("shared_mode", {"MODELS_SHARED": "1", "MODELS_STORAGE": "journal"}),
+]
+
+
+if __name__ == "__main__":
+    main(CHECKS, globals())
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+""" Main snapshot
+
+Snapshots: restored while the files are those they were taken from,
+ignored otherwise
+"""
+import os
+
+from storage_checks import main, run, save_users
+from models import base
+from models.base import LOAD_STATS
+from models.user import User
+
+
+def check_snapshot_writer():
+    """ Save users and exit, which writes the snapshot
+    """
+    User.load_from_file()
+    save_users(*("user{}@hbtn.io".format(i) for i in range(100)))
+
+
+def check_other_writer():
+    """ Save one more user
+    """
+    User.load_from_file()
+    User(email="other@hbtn.io").save()
+
+
+def check_snapshot_load():
+    """ Load the users and print where they came from
+    """
+    User.load_from_file()
+    user = User.search({"email": "user7@hbtn.io"})[0]
+    assert user.is_valid_password("pwd")
+    assert user.created_at <= user.updated_at
+    print(LOAD_STATS["User"]["source"], User.count())
+
+
+def check_snapshot():
+    """ Users are restored from the snapshot while the files are those
+    it was taken from, and read from the files otherwise; in journal
+    mode, records appended to the journal since are replayed over it
+    """
+    run("snapshot_writer")
+    assert os.path.exists(".db_User.snapshot")
+    assert run("snapshot_load").split() == ["snapshot", "100"]
+    run("other_writer", MODELS_SNAPSHOT="0")
+    source = "snapshot" if base.STORAGE_MODE == "journal" else "files"
+    assert run("snapshot_load").split() == [source, "101"]
+    assert run("snapshot_load").split() == ["snapshot", "101"]
+    with open(".db_User.snapshot", "r+b") as f:
+        f.seek(-2, os.SEEK_END)
+        f.write(b"!!")
+    assert run("snapshot_load").split() == ["files", "101"]
+
+
+CHECKS = [
+    ("snapshot", {"MODELS_SNAPSHOT": "1"}),
+    ("snapshot", {"MODELS_SNAPSHOT": "1", "MODELS_LAZY_LOAD": "1"}),
+    ("snapshot", {"MODELS_SNAPSHOT": "1", "MODELS_STORAGE": "journal"}),
+]
+
+
+if __name__ == "__main__":
+    main(CHECKS, globals())
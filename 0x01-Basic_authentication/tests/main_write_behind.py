@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+""" Main write behind
+
+Deferred writes: Base.batch() blocks, and the write-behind thread
+"""
+import os
+import time
+
+from storage_checks import emails, main
+from models import base
+from models.base import Base
+from models.user import User
+
+
+def check_batch():
+    """ Saves of a batch are written once, when the block exits, and
+    are kept pending when the write fails
+    """
+    User.load_from_file()
+    with Base.batch():
+        User(email="a@hbtn.io").save()
+        User(email="b@hbtn.io").save()
+        assert not os.path.exists(".db_User.json")
+    User.load_from_file()
+    assert emails() == ["a@hbtn.io", "b@hbtn.io"], emails()
+    write_file = Base._write_file
+
+    def failing(file_path, objs):
+        raise OSError("disk full")
+
+    Base._write_file = staticmethod(failing)
+    try:
+        with Base.batch():
+            User(email="c@hbtn.io").save()
+    except OSError:
+        pass
+    else:
+        raise AssertionError("batch write failure not raised")
+    Base._write_file = staticmethod(write_file)
+    Base.flush()
+    User.load_from_file()
+    assert emails() == ["a@hbtn.io", "b@hbtn.io", "c@hbtn.io"], emails()
+
+
+def check_write_behind():
+    """ Deferred writes reach the files on the interval, and are kept
+    pending when they fail
+    """
+    User.load_from_file()
+    write_file = Base._write_file
+
+    def failing(file_path, objs):
+        raise OSError("disk full")
+
+    Base._write_file = staticmethod(failing)
+    User(email="late@hbtn.io").save()
+    time.sleep(0.5)
+    assert not os.path.exists(".db_User.json")
+    Base._write_file = staticmethod(write_file)
+    time.sleep(0.5)
+    base.DATA.pop("User")
+    User.load_from_file()
+    assert emails() == ["late@hbtn.io"], emails()
+
+
+CHECKS = [
+    ("batch", {}),
+    ("write_behind", {"MODELS_WRITE_BEHIND_INTERVAL": "0.1"}),
+]
+
+
+if __name__ == "__main__":
+    main(CHECKS, globals())
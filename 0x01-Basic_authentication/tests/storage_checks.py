@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+""" Storage checks
+
+Helpers of the tests/main_*.py scripts checking the storage modes of
+models.base. Every check runs in a scratch directory, in its own process
+since the MODELS_* settings are read at import time:
+
+    python3 tests/main_<name>.py           # run every check
+    python3 tests/main_<name>.py <check>   # run one check, in the
+                                           # current directory
+"""
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+from typing import Callable, Dict, List, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models.base import Base  # noqa: E402
+from models.user import User  # noqa: E402
+
+SCRIPT = os.path.abspath(sys.argv[0])
+
+
+def run(check: str, **env: str) -> str:
+    """ Run a check of the current script in a child process, in the
+    current directory, and return the last line it printed
+    """
+    result = subprocess.run(
+        [sys.executable, SCRIPT, check],
+        env=dict(os.environ, **env), stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT, universal_newlines=True)
+    assert result.returncode == 0, result.stdout
+    return result.stdout.splitlines()[-1] if result.stdout else ""
+
+
+def emails() -> list:
+    """ Sorted emails of the loaded users
+    """
+    return sorted(u.email for u in User.all())
+
+
+def save_users(*addresses: str) -> list:
+    """ Save a new user for every email address, in one batch
+    """
+    users = []
+    with Base.batch():
+        for email in addresses:
+            user = User(email=email)
+            user.password = "pwd"
+            user.save()
+            users.append(user)
+    return users
+
+
+def main(checks: List[Tuple[str, Dict[str, str]]],
+         functions: Dict[str, Callable]):
+    """ Run the check named on the command line, or every (name,
+    environment) pair of checks in a scratch directory and exit with 1
+    if one of them failed
+    """
+    if len(sys.argv) > 1:
+        functions["check_" + sys.argv[1]]()
+        sys.exit(0)
+    failed = 0
+    for name, env in checks:
+        label = " ".join([name] + ["{}={}".format(*i) for i in env.items()])
+        workdir = tempfile.mkdtemp(prefix="models-storage-")
+        cwd = os.getcwd()
+        os.chdir(workdir)
+        try:
+            run(name, **env)
+            print("OK   {}".format(label))
+        except AssertionError as e:
+            failed += 1
+            print("FAIL {}\n{}".format(label, e))
+        finally:
+            os.chdir(cwd)
+            shutil.rmtree(workdir, ignore_errors=True)
+    sys.exit(1 if failed else 0)
@@ -6,7 +6,7 @@ from os import getenv
 from api.v1.views import app_views
 from flask import Flask, jsonify, request, abort
 from flask_cors import CORS
-from api.v1.auth.auth import Auth
+from api.v1.auth.auth import Auth, PathMatcher
 
 app = Flask(__name__)
 app.register_blueprint(app_views, url_prefix='/api/v1')
@@ -31,6 +31,16 @@ if auth_type:
         from api.v1.auth.auth import Auth
         auth = Auth()
 
+excluded_paths = PathMatcher([
+    '/api/v1/status/',
+    '/api/v1/unauthorized/',
+    '/api/v1/forbidden/',
+    '/api/v1/auth_session/login/',
+])
+for excluded_path in getenv("AUTH_EXCLUDED_PATHS", "").split(","):
+    if excluded_path.strip():
+        excluded_paths.add(excluded_path.strip())
+
 
 @app.before_request
 def before_request():
@@ -40,15 +50,6 @@ def before_request():
     if auth is None:
         return
 
-    excluded_paths = [
-        '/api/v1/status/',
-        '/api/v1/unauthorized/',
-        '/api/v1/forbidden/',
-        '/api/v1/auth_session/login/'
-    ]
-    if request.path in excluded_paths:
-        return
-
     if auth.require_auth(request.path, excluded_paths):
         auth_header = auth.authorization_header(request)
         session_cookie = auth.session_cookie(request)
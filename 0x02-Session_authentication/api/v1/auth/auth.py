@@ -4,6 +4,75 @@ Authentication module for the API.
 """
 import os
 from flask import request
+from functools import lru_cache
+from typing import Iterable, Tuple, Union
+
+
+class PathMatcher:
+    """
+    Compiled list of paths, matched in time independent of its length.
+
+    A path ending with `*` matches every path starting with what comes
+    before it; any other path matches exactly, trailing slashes
+    ignored. Exact paths are kept in a set, and wildcard prefixes in a
+    set per prefix length, so a match costs one lookup plus one per
+    distinct prefix length.
+    """
+
+    def __init__(self, paths: Iterable[str] = ()):
+        """
+        Compile the paths.
+
+        :param paths: The paths and `*` wildcards to match.
+        """
+        self.exact = set()
+        self.prefixes = {}
+        for excluded_path in paths:
+            self.add(excluded_path)
+
+    def add(self, excluded_path: str):
+        """
+        Add a path or `*` wildcard.
+
+        :param excluded_path: The path to match.
+        """
+        if excluded_path.endswith('*'):
+            prefix = excluded_path[:-1]
+            self.prefixes.setdefault(len(prefix), set()).add(prefix)
+        else:
+            self.exact.add(excluded_path.rstrip('/'))
+
+    def match(self, path: str) -> bool:
+        """
+        Check if a path matches one of the compiled paths.
+
+        :param path: The path to check.
+        :return: True if it matches, False otherwise.
+        """
+        path = path.rstrip('/')
+        if path in self.exact:
+            return True
+        for length, prefixes in self.prefixes.items():
+            if path[:length] in prefixes:
+                return True
+        return False
+
+    def __bool__(self) -> bool:
+        """
+        Check if any path was compiled.
+        """
+        return bool(self.exact or self.prefixes)
+
+
+@lru_cache(maxsize=32)
+def compile_paths(paths: Tuple[str, ...]) -> PathMatcher:
+    """
+    Compile a list of paths once, for callers passing plain lists.
+
+    :param paths: The paths and `*` wildcards to match.
+    :return: The PathMatcher of the paths.
+    """
+    return PathMatcher(paths)
 
 
 class Auth:
@@ -11,20 +80,24 @@ class Auth:
     Auth class to manage API authentication.
     """
 
-    def require_auth(self, path: str, excluded_paths: list) -> bool:
+    def require_auth(self, path: str,
+                     excluded_paths: Union[PathMatcher, list]) -> bool:
         """
         Check if authentication is required for a given path.
 
         :param path: The path to check.
-        :param excluded_paths: List of paths that don't require authentication.
+        :param excluded_paths: PathMatcher, or list, of the paths that
+        don't require authentication; a path ending with `*` excludes
+        every path starting with the rest of it.
         :return: True if authentication is required, False otherwise.
         """
-        if path is None or excluded_paths is None or len(excluded_paths) == 0:
+        if path is None or not excluded_paths:
             return True
 
-        path = path.rstrip("/") + "/"
+        if not isinstance(excluded_paths, PathMatcher):
+            excluded_paths = compile_paths(tuple(excluded_paths))
 
-        return path not in excluded_paths
+        return not excluded_paths.match(path)
 
     def authorization_header(self, request=None) -> str:
         """
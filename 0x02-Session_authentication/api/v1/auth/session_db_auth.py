@@ -52,8 +52,8 @@ class SessionDBAuth(SessionExpAuth):
         session_id = self.session_cookie(request)
         if not session_id:
             return False
-        user_session = UserSession.search({"session_id": session_id})
+        user_session = UserSession.query(session_id=session_id).first()
         if user_session:
-            user_session[0].remove()
+            user_session.remove()
             return True
         return False
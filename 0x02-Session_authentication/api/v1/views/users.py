@@ -1,22 +1,89 @@
 #!/usr/bin/env python3
 """ Module of Users views
 """
+import base64
+import binascii
+import json
 from api.v1.views import app_views
-from flask import abort, jsonify, request
+from flask import Response, abort, jsonify, request, url_for
 from models.user import User
 from api.v1.auth.auth import Auth
 
 auth = Auth()
 
+MAX_PAGE_SIZE = 1000
+STREAM_CHUNK_SIZE = 500
+
+
+def encode_cursor(user_id: str) -> str:
+    """ Opaque pagination cursor pointing after the User ID user_id
+    """
+    return base64.urlsafe_b64encode(user_id.encode()).decode()
+
+
+def decode_cursor(cursor: str) -> str:
+    """ User ID of a pagination cursor, ValueError if it is malformed
+    """
+    try:
+        return base64.b64decode(cursor, b"-_", validate=True).decode()
+    except (binascii.Error, UnicodeError) as e:
+        raise ValueError("invalid cursor") from e
+
+
+def stream_users():
+    """ Yield the JSON array of all User objects piece by piece, reading
+    them a page at a time
+    """
+    yield "["
+    users, after = User.page(STREAM_CHUNK_SIZE)
+    separator = ""
+    while True:
+        for user in users:
+            yield separator + json.dumps(user.to_json())
+            separator = ","
+        if after is None:
+            break
+        users, after = User.page(STREAM_CHUNK_SIZE, after)
+    yield "]"
+
 
 @app_views.route('/users', methods=['GET'], strict_slashes=False)
 def view_all_users() -> str:
     """ GET /api/v1/users
+    Query parameters:
+      - limit (optional): page size, at most MAX_PAGE_SIZE
+      - cursor (optional): next_cursor of the previous page
+      - stream (optional): 1 to stream the whole list
     Return:
-      - list of all User objects JSON represented
+      - list of all User objects JSON represented, streamed if stream=1
+      - with limit or cursor: object with the User objects of the page,
+        in ID order, under "users" and the cursor of the next page under
+        "next_cursor", also sent as a Link header; null on the last page
+      - 400 if limit or cursor is invalid
     """
-    all_users = [user.to_json() for user in User.all()]
-    return jsonify(all_users)
+    limit = request.args.get('limit')
+    cursor = request.args.get('cursor')
+    if limit is None and cursor is None:
+        if request.args.get('stream') == '1':
+            return Response(stream_users(), mimetype='application/json')
+        all_users = [user.to_json() for user in User.all()]
+        return jsonify(all_users)
+    try:
+        limit = int(limit) if limit is not None else MAX_PAGE_SIZE
+        after = decode_cursor(cursor) if cursor is not None else None
+    except ValueError:
+        return jsonify({'error': "Wrong limit or cursor"}), 400
+    if limit < 1 or limit > MAX_PAGE_SIZE:
+        return jsonify({'error': "Wrong limit or cursor"}), 400
+    users, after = User.page(limit, after)
+    next_cursor = encode_cursor(after) if after is not None else None
+    response = jsonify({'users': [user.to_json() for user in users],
+                        'next_cursor': next_cursor})
+    if next_cursor is not None:
+        next_url = url_for('app_views.view_all_users', limit=limit,
+                           cursor=next_cursor, _external=True)
+        response.headers['Link'] = '<{}>; rel="next"'.format(next_url)
+    return response
 
 
 @app_views.route('/users/<user_id>', methods=['GET'], strict_slashes=False)
@@ -1,21 +1,419 @@
 #!/usr/bin/env python3
 """ Base module
 """
+from bisect import bisect_left, bisect_right, insort
+from contextlib import contextmanager
 from datetime import datetime
-from typing import TypeVar, List, Iterable
-from os import path
+from typing import (TypeVar, Any, BinaryIO, List, Iterable, Iterator,
+                    Mapping, Optional, Tuple)
+from os import getenv, path
+import atexit
+import glob
 import json
+import logging
+import os
+import threading
+import time
 import uuid
+import zlib
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+from models import snapshot
+from models.formats import FORMATS, detect
 
 
 TIMESTAMP_FORMAT = "%Y-%m-%dT%H:%M:%S"
+STORAGE_MODE = getenv("MODELS_STORAGE", "file")
+JOURNAL_COMPACT_BYTES = int(getenv("MODELS_JOURNAL_COMPACT_BYTES",
+                                   str(1024 * 1024)))
+WRITE_BEHIND_INTERVAL = float(getenv("MODELS_WRITE_BEHIND_INTERVAL", "0"))
+SHARED_MODE = getenv("MODELS_SHARED", "0") == "1"
+LAZY_LOAD = getenv("MODELS_LAZY_LOAD", "0") == "1"
+STORAGE_FORMAT = getenv("MODELS_FORMAT", "json")
+SHARDS = int(getenv("MODELS_SHARDS", "1"))
+SNAPSHOTS = getenv("MODELS_SNAPSHOT", "0") == "1"
 DATA = {}
+INDEXES = {}
+INDEXED_VALUES = {}
+INDEX_KEYS = {}
+PENDING = {}
+GENERATIONS = {}
+ORDERS = {}
+SHARD_IDS = {}
+LOAD_STATS = {}
+
+_pending_lock = threading.Lock()
+_flush_lock = threading.Lock()
+_batch_state = threading.local()
+_flusher = None
+_flusher_stop = threading.Event()
+_file_locks = {}
+_rw_locks = {}
+_file_locks_guard = threading.Lock()
+_materialize_lock = threading.Lock()
+_loaded_classes = {}
+_UNSET = object()
+logger = logging.getLogger(__name__)
+
+
+def _file_signature(file_path: str) -> Optional[tuple]:
+    """ Identity of the current version of a file: inode, modification
+    time and size, or None if it does not exist
+    """
+    try:
+        st = os.stat(file_path)
+    except OSError:
+        return None
+    return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+
+class _FileLock():
+    """ Lock shared by the threads of this process and, through flock on
+    a lock file, by every process using the same storage directory
+
+    It is reentrant, so a writer holding it can reload or rewrite files
+    """
+
+    def __init__(self, lock_path: str):
+        """ Initialize the lock for a lock file path
+        """
+        self.lock_path = lock_path
+        self._lock = threading.RLock()
+        self._fd = None
+        self._depth = 0
+
+    def __enter__(self):
+        """ Acquire the lock
+        """
+        self._lock.acquire()
+        if self._depth == 0 and fcntl is not None:
+            self._fd = os.open(self.lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+        self._depth += 1
+        return self
+
+    def __exit__(self, *exc_info):
+        """ Release the lock
+        """
+        self._depth -= 1
+        if self._depth == 0 and self._fd is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+            os.close(self._fd)
+            self._fd = None
+        self._lock.release()
+
+
+class _RWLock():
+    """ Readers/writer lock of the objects of a class held in memory
+
+    Any number of threads can read at once, while a writer excludes
+    everyone else; a waiting writer keeps new readers out so it cannot
+    starve. A writer can re-enter both sides and a reader can read
+    again, but a reader cannot upgrade to writing
+    """
+
+    def __init__(self):
+        """ Initialize an unlocked lock
+        """
+        self._cond = threading.Condition(threading.Lock())
+        self._readers = 0
+        self._writer = None
+        self._waiting_writers = 0
+        self._local = threading.local()
+
+    @contextmanager
+    def read(self) -> Iterator[None]:
+        """ Hold the lock as one of the readers
+        """
+        local = self._local
+        nested = self._writer == threading.get_ident() or \
+            getattr(local, 'depth', 0) > 0
+        if not nested:
+            with self._cond:
+                while self._writer is not None or self._waiting_writers:
+                    self._cond.wait()
+                self._readers += 1
+        local.depth = getattr(local, 'depth', 0) + 1
+        try:
+            yield
+        finally:
+            local.depth -= 1
+            if not nested:
+                with self._cond:
+                    self._readers -= 1
+                    if self._readers == 0:
+                        self._cond.notify_all()
+
+    @contextmanager
+    def write(self) -> Iterator[None]:
+        """ Hold the lock as the only writer
+        """
+        me = threading.get_ident()
+        if self._writer == me:
+            yield
+            return
+        if getattr(self._local, 'depth', 0) > 0:
+            raise RuntimeError("cannot write while holding the read lock")
+        with self._cond:
+            self._waiting_writers += 1
+            while self._writer is not None or self._readers:
+                self._cond.wait()
+            self._waiting_writers -= 1
+            self._writer = me
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._writer = None
+                self._cond.notify_all()
+
+
+def _complete_length(f: BinaryIO) -> int:
+    """ Length of a file opened for reading up to the end of its last
+    complete line, leaving out a line cut short by a crash
+    """
+    end = f.seek(0, os.SEEK_END)
+    pos = end
+    while pos > 0:
+        step = min(pos, 4096)
+        f.seek(pos - step)
+        newline = f.read(step).rfind(b"\n")
+        if newline >= 0:
+            return pos - step + newline + 1
+        pos -= step
+    return 0
+
+
+def _parse_timestamp(value: str) -> datetime:
+    """ Parse a TIMESTAMP_FORMAT string, using the C ISO 8601 parser
+    rather than strptime
+    """
+    return datetime.fromisoformat(value)
+
+
+def _format_timestamp(value: datetime) -> str:
+    """ Format a datetime as TIMESTAMP_FORMAT, using isoformat rather
+    than strftime
+    """
+    return value.isoformat(timespec='seconds')
+
+
+class _Record(tuple):
+    """ Raw JSON record of an object loaded in lazy mode, compacted into
+    the values of the slotted attributes of its class, in the order of
+    `fields`; an attribute missing from the record is None
+
+    The subclass of every model class is made by Base._record_type
+    """
+
+    __slots__ = ()
+    fields = ()
+    positions = {}
+
+    @classmethod
+    def of(cls, obj_json: Mapping) -> '_Record':
+        """ Compact a JSON record
+        """
+        return cls(map(obj_json.get, cls.fields))
+
+    def get(self, attribute: str, default: Any = None) -> Any:
+        """ Value of an attribute, or default if the class has none
+        """
+        position = self.positions.get(attribute)
+        return default if position is None else self[position]
+
+    def to_json(self) -> dict:
+        """ Expand the record back into a JSON dictionary
+        """
+        return dict(zip(self.fields, self))
+
+
+class _LazyObjects(dict):
+    """ Objects of a class loaded in lazy mode
+
+    Values stay the raw records read from file, compacted as _Record
+    tuples, until they are accessed, then are replaced by the object
+    built from them
+    """
+
+    def __init__(self, cls: type):
+        """ Initialize an empty store for the objects of cls
+        """
+        super().__init__()
+        self.cls = cls
+
+    def _materialize(self, obj_id: str, value: Any) -> Any:
+        """ Return the object for a stored value, building it from its
+        raw record on first access
+        """
+        if isinstance(value, _Record):
+            obj = self.cls(**value.to_json())
+            with _materialize_lock:
+                value = dict.get(self, obj_id)
+                if isinstance(value, _Record):
+                    dict.__setitem__(self, obj_id, obj)
+                    value = obj
+        return value
+
+    def __getitem__(self, obj_id: str) -> Any:
+        """ Return the object with this ID
+        """
+        return self._materialize(obj_id, dict.__getitem__(self, obj_id))
+
+    def get(self, obj_id: str, default: Any = None) -> Any:
+        """ Return the object with this ID, or default
+        """
+        if obj_id not in self:
+            return default
+        return self[obj_id]
+
+    def values(self) -> Iterator[Any]:
+        """ Iterate over every object, building those not accessed yet
+        """
+        for obj_id, value in list(dict.items(self)):
+            yield self._materialize(obj_id, value)
+
+    def items(self) -> Iterator[Tuple[str, Any]]:
+        """ Iterate over every (ID, object) pair
+        """
+        for obj_id, value in list(dict.items(self)):
+            yield obj_id, self._materialize(obj_id, value)
+
+
+def _serialized(value: Any) -> dict:
+    """ JSON record of a stored value, which is either an object or, in
+    lazy mode, the raw record it has not been built from yet
+    """
+    if isinstance(value, _Record):
+        return value.to_json()
+    return value.to_json(True)
+
+
+def _deferring() -> bool:
+    """ Whether writes are currently deferred, inside a `Base.batch()`
+    block of this thread or in write-behind mode
+    """
+    return getattr(_batch_state, 'depth', 0) > 0 or WRITE_BEHIND_INTERVAL > 0
+
+
+def _start_flusher():
+    """ Start the background thread flushing deferred writes every
+    WRITE_BEHIND_INTERVAL seconds, once per process
+    """
+    global _flusher
+    if _flusher is not None and _flusher.is_alive():
+        return
+
+    def run():
+        while not _flusher_stop.wait(WRITE_BEHIND_INTERVAL):
+            try:
+                Base.flush()
+            except Exception:
+                logger.exception("write-behind flush failed, retrying")
+
+    _flusher = threading.Thread(target=run, name="models-flusher",
+                                daemon=True)
+    _flusher.start()
+
+
+def _index_object(s_class: str, attributes: Iterable[str], obj_id: str,
+                  values: Mapping):
+    """ Add an object to the secondary indexes of its class
+
+    `values` maps each indexed attribute to the object's value; the
+    object is first removed from the entries of its previous values
+    """
+    indexes = INDEXES.setdefault(s_class, {})
+    indexed = INDEXED_VALUES.setdefault(s_class, {})
+    previous = indexed.get(obj_id)
+    if previous is not None:
+        if all(previous.get(a) == values.get(a) for a in attributes):
+            return
+        _unindex_object(s_class, obj_id)
+    current = {}
+    for attribute in attributes:
+        value = values.get(attribute)
+        index = indexes.setdefault(attribute, {})
+        try:
+            ids = index.get(value)
+        except TypeError:
+            continue
+        if ids is None:
+            ids = index[value] = {}
+            keys = INDEX_KEYS.get(s_class, {}).get(attribute)
+            if keys is not None and isinstance(value, str):
+                insort(keys, value)
+        ids[obj_id] = None
+        current[attribute] = value
+    indexed[obj_id] = current
+
+
+def _unindex_object(s_class: str, obj_id: str):
+    """ Remove an object from the secondary indexes of its class
+    """
+    indexes = INDEXES.get(s_class, {})
+    previous = INDEXED_VALUES.get(s_class, {}).pop(obj_id, None)
+    if previous is None:
+        return
+    for attribute, value in previous.items():
+        ids = indexes[attribute].get(value)
+        if ids is not None:
+            ids.pop(obj_id, None)
+            if not ids:
+                del indexes[attribute][value]
+                keys = INDEX_KEYS.get(s_class, {}).get(attribute)
+                if keys is not None and isinstance(value, str):
+                    i = bisect_left(keys, value)
+                    if i < len(keys) and keys[i] == value:
+                        del keys[i]
+
+
+def _shard_of(obj_id: str, shards: int) -> int:
+    """ Index of the shard holding the object with this ID
+    """
+    return zlib.crc32(obj_id.encode()) % shards
+
+
+def _track_id(s_class: str, obj_id: str):
+    """ Add an object ID to the cached sorted IDs and shard members of
+    its class
+    """
+    order = ORDERS.get(s_class)
+    if order is not None:
+        i = bisect_left(order, obj_id)
+        if i == len(order) or order[i] != obj_id:
+            order.insert(i, obj_id)
+    members = SHARD_IDS.get(s_class)
+    if members is not None:
+        members[_shard_of(obj_id, len(members))][obj_id] = None
+
+
+def _untrack_id(s_class: str, obj_id: str):
+    """ Remove an object ID from the cached sorted IDs and shard members
+    of its class
+    """
+    order = ORDERS.get(s_class)
+    if order is not None:
+        i = bisect_left(order, obj_id)
+        if i < len(order) and order[i] == obj_id:
+            del order[i]
+    members = SHARD_IDS.get(s_class)
+    if members is not None:
+        members[_shard_of(obj_id, len(members))].pop(obj_id, None)
 
 
 class Base():
     """ Base class
+
+    How the objects are stored is set by the MODELS_* environment
+    variables described in the Storage section of the README
     """
 
+    __slots__ = ('id', 'created_at', 'updated_at', '_json_cache')
+    indexed_attributes = ()
+
     def __init__(self, *args: list, **kwargs: dict):
         """ Initialize a Base instance
         """
@@ -25,16 +423,33 @@ class Base():
 
         self.id = kwargs.get('id', str(uuid.uuid4()))
         if kwargs.get('created_at') is not None:
-            self.created_at = datetime.strptime(kwargs.get('created_at'),
-                                                TIMESTAMP_FORMAT)
+            self.created_at = _parse_timestamp(kwargs.get('created_at'))
         else:
             self.created_at = datetime.utcnow()
         if kwargs.get('updated_at') is not None:
-            self.updated_at = datetime.strptime(kwargs.get('updated_at'),
-                                                TIMESTAMP_FORMAT)
+            self.updated_at = _parse_timestamp(kwargs.get('updated_at'))
         else:
             self.updated_at = datetime.utcnow()
 
+    def __setattr__(self, name: str, value: Any):
+        """ Set an attribute, dropping the cached JSON representation
+        """
+        object.__setattr__(self, name, value)
+        if name != '_json_cache':
+            object.__setattr__(self, '_json_cache', None)
+
+    def _state(self) -> dict:
+        """ Attributes that are set, by name, without the cached JSON
+        representation, as stored in snapshots
+        """
+        state = {}
+        for key in self._fields():
+            value = getattr(self, key, _UNSET)
+            if value is not _UNSET:
+                state[key] = value
+        state.update(getattr(self, '__dict__', {}))
+        return state
+
     def __eq__(self, other: TypeVar('Base')) -> bool:
         """ Equality
         """
@@ -44,95 +459,716 @@ class Base():
             return False
         return (self.id == other.id)
 
+    @classmethod
+    def _fields(cls) -> Tuple[str, ...]:
+        """ Names of the slotted attributes of the class, base classes
+        first
+        """
+        fields = cls.__dict__.get('_slot_fields')
+        if fields is None:
+            fields = tuple(name for klass in reversed(cls.__mro__)
+                           for name in klass.__dict__.get('__slots__', ())
+                           if name != '_json_cache')
+            cls._slot_fields = fields
+        return fields
+
+    @classmethod
+    def _record_type(cls) -> type:
+        """ _Record subclass holding the raw records of the class in lazy
+        mode
+        """
+        record = cls.__dict__.get('_record_class')
+        if record is None:
+            fields = cls._fields()
+            record = type(cls.__name__ + 'Record', (_Record,), {
+                '__slots__': (), 'fields': fields,
+                'positions': {key: i for i, key in enumerate(fields)}})
+            cls._record_class = record
+        return record
+
     def to_json(self, for_serialization: bool = False) -> dict:
         """ Convert the object a JSON dictionary
+
+        Both representations are computed once and cached until an
+        attribute is set
         """
-        result = {}
-        for key, value in self.__dict__.items():
-            if not for_serialization and key[0] == '_':
-                continue
-            if type(value) is datetime:
-                result[key] = value.strftime(TIMESTAMP_FORMAT)
-            else:
-                result[key] = value
-        return result
+        cache = getattr(self, '_json_cache', None)
+        if cache is None:
+            public = {}
+            full = {}
+            items = [(key, getattr(self, key, _UNSET))
+                     for key in self._fields()]
+            items.extend(getattr(self, '__dict__', {}).items())
+            for key, value in items:
+                if value is _UNSET:
+                    continue
+                if type(value) is datetime:
+                    value = _format_timestamp(value)
+                full[key] = value
+                if key[0] != '_':
+                    public[key] = value
+            cache = (public, full)
+            object.__setattr__(self, '_json_cache', cache)
+        return dict(cache[1] if for_serialization else cache[0])
+
+    @classmethod
+    def _file_path(cls, fmt: str = None, shard: int = None) -> str:
+        """ Path of the file holding all objects of the class, or one
+        shard of them, in the configured STORAGE_FORMAT unless fmt is
+        given
+        """
+        extension = FORMATS[fmt or STORAGE_FORMAT].extension
+        if shard is None:
+            return ".db_{}{}".format(cls.__name__, extension)
+        return ".db_{}.{}{}".format(cls.__name__, shard, extension)
+
+    @classmethod
+    def _shard_paths(cls, fmt: str = None) -> List[str]:
+        """ Paths of the existing shard files of the class in a format
+        """
+        pattern = glob.escape(".db_{}.".format(cls.__name__)) + "[0-9]*" \
+            + FORMATS[fmt or STORAGE_FORMAT].extension
+        return sorted(p for p in glob.glob(pattern)
+                      if p.split(".")[-2].isdigit())
+
+    @classmethod
+    def _stored_files(cls) -> List[str]:
+        """ Paths of the objects files to load, preferring the configured
+        format and layout, or an empty list if there is none
+        """
+        formats = [STORAGE_FORMAT]
+        formats += [f for f in FORMATS if f != STORAGE_FORMAT]
+        for fmt in formats:
+            single = [cls._file_path(fmt)] if path.exists(
+                cls._file_path(fmt)) else []
+            layouts = [single, cls._shard_paths(fmt)]
+            if SHARDS > 1:
+                layouts.reverse()
+            for files in layouts:
+                if files:
+                    return files
+        return []
+
+    @classmethod
+    def _stored_signature(cls) -> tuple:
+        """ Identity of the current version of the objects files
+        """
+        return tuple((p, _file_signature(p)) for p in cls._stored_files())
+
+    @classmethod
+    def _journal_path(cls) -> str:
+        """ Path of the append-only journal of the class
+        """
+        return ".db_{}.journal".format(cls.__name__)
+
+    @classmethod
+    def _locked(cls):
+        """ Lock serializing the writers of the class files, across
+        processes in shared mode
+        """
+        key = cls._lock_path() if SHARED_MODE else cls.__name__
+        with _file_locks_guard:
+            if key not in _file_locks:
+                _file_locks[key] = _FileLock(key) if SHARED_MODE \
+                    else threading.RLock()
+            return _file_locks[key]
+
+    @classmethod
+    def _rwlock(cls) -> _RWLock:
+        """ Readers/writer lock of the objects of the class in memory
+        """
+        s_class = cls.__name__
+        with _file_locks_guard:
+            if s_class not in _rw_locks:
+                _rw_locks[s_class] = _RWLock()
+            return _rw_locks[s_class]
+
+    @classmethod
+    def _read_file(cls, file_path: str, objs: dict) -> dict:
+        """ Add the objects of a file to objs, as raw records in lazy
+        mode, and return it
+        """
+        with open(file_path, 'rb') as f:
+            fmt = detect(f)
+            if fmt is not None and LAZY_LOAD:
+                record = cls._record_type().of
+                for obj_id, obj_json in fmt.iter_load(f):
+                    dict.__setitem__(objs, obj_id, record(obj_json))
+            elif fmt is not None:
+                for obj_id, obj_json in fmt.load(f).items():
+                    dict.__setitem__(objs, obj_id, cls(**obj_json))
+        return objs
 
     @classmethod
     def load_from_file(cls):
-        """ Load all objects from file
+        """ Load all objects from their snapshot or from file, then
+        replay the journal
         """
         s_class = cls.__name__
-        file_path = ".db_{}.json".format(s_class)
-        DATA[s_class] = {}
-        if not path.exists(file_path):
+        start = time.perf_counter()
+        with cls._locked():
+            restored = cls._read_snapshot() if SNAPSHOTS else None
+            if restored is not None:
+                store, generation = restored
+            else:
+                files = cls._stored_files()
+                store = _LazyObjects(cls) if LAZY_LOAD else {}
+                for file_path in files:
+                    cls._read_file(file_path, store)
+                generation = {"file": cls._stored_signature(),
+                              "journal": None, "offset": 0}
+            generation["version"] = cls._version()
+            with cls._rwlock().write():
+                DATA[s_class] = store
+                ORDERS.pop(s_class, None)
+                SHARD_IDS.pop(s_class, None)
+                GENERATIONS[s_class] = generation
+                cls._reindex()
+                cls._replay_journal(generation["offset"])
+        _loaded_classes[s_class] = cls
+        LOAD_STATS[s_class] = {
+            "source": "files" if restored is None else "snapshot",
+            "objects": len(store),
+            "seconds": time.perf_counter() - start,
+        }
+        logger.info("%s loaded from %s: %d objects in %.3fs", s_class,
+                    LOAD_STATS[s_class]["source"], len(store),
+                    LOAD_STATS[s_class]["seconds"])
+
+    @classmethod
+    def _snapshot_path(cls) -> str:
+        """ Path of the binary image of the objects of the class
+        """
+        return ".db_{}.snapshot".format(cls.__name__)
+
+    @classmethod
+    def save_snapshot(cls):
+        """ Dump the objects of the class into its binary image, along
+        with the state of the files they match
+        """
+        s_class = cls.__name__
+        if cls in PENDING:
+            Base.flush()
+        with cls._locked():
+            with cls._rwlock().read():
+                if s_class not in GENERATIONS or s_class not in DATA:
+                    return
+                objs = dict.copy(DATA[s_class])
+                generation = GENERATIONS[s_class]
+                description = {"class": s_class, "fields": cls._fields(),
+                               "file": generation.get("file"),
+                               "journal": generation.get("journal"),
+                               "offset": generation.get("offset", 0)}
+            for obj_id, value in objs.items():
+                if isinstance(value, _Record):
+                    objs[obj_id] = value.to_json()
+            snapshot_path = cls._snapshot_path()
+            tmp_path = "{}.{}.tmp".format(snapshot_path, os.getpid())
+            with open(tmp_path, 'wb') as f:
+                snapshot.dump(description, objs, f)
+            os.replace(tmp_path, snapshot_path)
+
+    @classmethod
+    def _read_snapshot(cls) -> Optional[Tuple[dict, dict]]:
+        """ Objects and file generation restored from the binary image,
+        or None if there is no usable image for the current files
+        """
+        try:
+            with open(cls._snapshot_path(), 'rb') as f:
+                description, objs = snapshot.load(f, cls, cls._fields())
+        except FileNotFoundError:
+            return None
+        except (OSError, snapshot.SnapshotError) as e:
+            logger.warning("%s snapshot ignored: %s", cls.__name__, e)
+            return None
+        signature = cls._stored_signature()
+        if description.get("class") != cls.__name__ or \
+                description.get("fields") != list(cls._fields()) or \
+                description.get("file") != json.loads(json.dumps(signature)):
+            return None
+        journal = _file_signature(cls._journal_path())
+        offset = description.get("offset") or 0
+        if journal is None and offset or journal is not None and \
+                (description.get("journal") not in (None, journal[0]) or
+                 journal[2] < offset):
+            return None
+        store = _LazyObjects(cls) if LAZY_LOAD else {}
+        for obj_id, value in objs.items():
+            if type(value) is dict:
+                value = cls._record_type().of(value) if LAZY_LOAD else \
+                    cls(**value)
+            dict.__setitem__(store, obj_id, value)
+        generation = {"file": signature,
+                      "journal": description.get("journal"),
+                      "offset": offset}
+        return store, generation
+
+    @classmethod
+    def _replay_journal(cls, offset: int = 0):
+        """ Apply the put/delete records of the journal, from the byte
+        offset on, to the objects
+
+        A last line cut short by a crash or by an append in progress is
+        left for the next replay, and a line that cannot be decoded is
+        skipped
+        """
+        s_class = cls.__name__
+        journal_path = cls._journal_path()
+        journal_signature = _file_signature(journal_path)
+        if journal_signature is None:
+            return
+        entries = []
+        with open(journal_path, 'rb') as f:
+            f.seek(offset)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                try:
+                    entries.append(json.loads(line))
+                except ValueError:
+                    logger.warning("%s journal: skipped unreadable record "
+                                   "at byte %d", s_class, offset)
+                offset += len(line)
+        with cls._rwlock().write():
+            for entry in entries:
+                if entry["op"] == "put":
+                    obj_json = entry["obj"]
+                    if isinstance(DATA[s_class], _LazyObjects):
+                        dict.__setitem__(DATA[s_class], obj_json["id"],
+                                         cls._record_type().of(obj_json))
+                    else:
+                        DATA[s_class][obj_json["id"]] = cls(**obj_json)
+                    cls._index_values(obj_json["id"], obj_json)
+                    _track_id(s_class, obj_json["id"])
+                else:
+                    DATA[s_class].pop(entry["id"], None)
+                    _unindex_object(s_class, entry["id"])
+                    _untrack_id(s_class, entry["id"])
+            GENERATIONS[s_class]["journal"] = journal_signature[0]
+            GENERATIONS[s_class]["offset"] = offset
+
+    @classmethod
+    def _lock_path(cls) -> str:
+        """ Path of the lock file of the class, which also holds the
+        version counter bumped by every write in shared mode
+        """
+        return ".db_{}.lock".format(cls.__name__)
+
+    @classmethod
+    def _version(cls) -> Optional[int]:
+        """ Read the version counter of the class files, or None if it
+        cannot be read
+        """
+        try:
+            with open(cls._lock_path(), 'rb') as f:
+                return int(f.read() or b"0")
+        except (OSError, ValueError):
+            return None
+
+    @classmethod
+    def _bump_version(cls):
+        """ Record a write to the class files, in shared mode
+        """
+        if not SHARED_MODE:
             return
+        version = (cls._version() or 0) + 1
+        with open(cls._lock_path(), 'wb') as f:
+            f.write(str(version).encode())
+        GENERATIONS[cls.__name__]["version"] = version
+
+    @classmethod
+    def _sync(cls) -> bool:
+        """ Catch up with the changes other processes wrote to the files
+        of the class, in shared mode
+
+        Only the new journal records are replayed when the objects file
+        is unchanged; the class is reloaded otherwise. Return True if
+        objects were reloaded
+        """
+        if not SHARED_MODE:
+            return False
+        s_class = cls.__name__
+        generation = GENERATIONS.get(s_class)
+        if generation is not None and \
+                generation.get("version") == cls._version():
+            return False
+        with cls._locked():
+            generation = GENERATIONS.get(s_class)
+            journal = _file_signature(cls._journal_path())
+            if generation is not None and journal is not None and \
+                    generation["file"] == cls._stored_signature() \
+                    and generation["journal"] in (None, journal[0]) \
+                    and journal[2] >= generation["offset"]:
+                cls._replay_journal(generation["offset"])
+            else:
+                cls.load_from_file()
+            GENERATIONS[s_class]["version"] = cls._version()
+        return True
+
+    @classmethod
+    def _append_journal(cls, entries: Iterable[dict]):
+        """ Append records to the journal, compacting it into the
+        objects file when it grows past JOURNAL_COMPACT_BYTES
+
+        A line left cut short by a crash is truncated first, so the new
+        records do not get glued to it
+        """
+        s_class = cls.__name__
+        journal_path = cls._journal_path()
+        with cls._locked():
+            with open(journal_path, 'a+b') as f:
+                end = f.seek(0, os.SEEK_END)
+                complete = _complete_length(f)
+                if complete < end:
+                    logger.warning("%s journal: dropped %d bytes of a torn "
+                                   "record", s_class, end - complete)
+                    f.truncate(complete)
+                f.write("".join(json.dumps(e) + "\n"
+                                for e in entries).encode())
+                size = f.tell()
+            generation = GENERATIONS.setdefault(
+                s_class, {"file": cls._stored_signature()})
+            generation["journal"] = _file_signature(journal_path)[0]
+            generation["offset"] = size
+            cls._bump_version()
+            if size > JOURNAL_COMPACT_BYTES:
+                cls.compact()
+
+    @classmethod
+    def compact(cls):
+        """ Fold the journal into the objects file
+        """
+        cls.save_to_file()
 
-        with open(file_path, 'r') as f:
-            objs_json = json.load(f)
-            for obj_id, obj_json in objs_json.items():
-                DATA[s_class][obj_id] = cls(**obj_json)
+    @classmethod
+    def _reindex(cls):
+        """ Rebuild the secondary indexes from the loaded objects
+        """
+        s_class = cls.__name__
+        INDEXES[s_class] = {a: {} for a in cls.indexed_attributes}
+        INDEXED_VALUES[s_class] = {}
+        INDEX_KEYS.pop(s_class, None)
+        for obj_id, value in dict.items(DATA[s_class]):
+            if isinstance(value, _Record):
+                cls._index_values(obj_id, value)
+            else:
+                value._index()
 
     @classmethod
-    def save_to_file(cls):
-        """ Save all objects to file
+    def _index_keys(cls, attribute: str) -> List[str]:
+        """ Sorted string values of an indexed attribute, cached until the
+        class is reloaded; call it holding the read lock
+        """
+        keys = INDEX_KEYS.setdefault(cls.__name__, {})
+        if attribute not in keys:
+            index = INDEXES[cls.__name__][attribute]
+            keys[attribute] = sorted(v for v in index if isinstance(v, str))
+        return keys[attribute]
+
+    @classmethod
+    def _index_values(cls, obj_id: str, values: Mapping):
+        """ Add an object to the secondary indexes given its attribute
+        values, such as a raw JSON record
+        """
+        attributes = cls.indexed_attributes
+        if attributes:
+            _index_object(cls.__name__, attributes, obj_id, values)
+
+    def _index(self):
+        """ Add the current object to the secondary indexes
+        """
+        attributes = self.__class__.indexed_attributes
+        if not attributes:
+            return
+        values = {a: getattr(self, a, None) for a in attributes}
+        _index_object(self.__class__.__name__, attributes, self.id, values)
+
+    @classmethod
+    def _shard_members(cls, shard: int) -> dict:
+        """ IDs of the objects of one shard, tracked from the first call
         """
         s_class = cls.__name__
-        file_path = ".db_{}.json".format(s_class)
+        members = SHARD_IDS.get(s_class)
+        if members is None or len(members) != SHARDS:
+            members = SHARD_IDS[s_class] = [{} for _ in range(SHARDS)]
+            for obj_id in DATA[s_class]:
+                members[_shard_of(obj_id, SHARDS)][obj_id] = None
+        return members[shard]
+
+    @staticmethod
+    def _write_file(file_path: str, objs: dict):
+        """ Atomically replace a file with a copy of some objects
+        """
         objs_json = {}
-        for obj_id, obj in DATA[s_class].items():
-            objs_json[obj_id] = obj.to_json(True)
+        for obj_id, value in objs.items():
+            objs_json[obj_id] = _serialized(value)
+        tmp_path = "{}.{}.tmp".format(file_path, os.getpid())
+        with open(tmp_path, 'wb') as f:
+            FORMATS[STORAGE_FORMAT].dump(objs_json, f)
+        os.replace(tmp_path, file_path)
 
-        with open(file_path, 'w') as f:
-            json.dump(objs_json, f)
+    @classmethod
+    def save_to_file(cls, shards: Iterable[int] = None):
+        """ Save all objects to file, which makes the journal obsolete
+
+        With SHARDS above 1, only the given shards are rewritten when
+        the files already have the configured layout and there is no
+        journal to fold in. The objects are copied under the read lock
+        and serialized and written once it is released
+        """
+        s_class = cls.__name__
+        with cls._locked():
+            layout = [cls._file_path()]
+            if SHARDS > 1:
+                layout = [cls._file_path(shard=k) for k in range(SHARDS)]
+                stored = set(cls._stored_files())
+                if shards is None or stored != set(layout) or \
+                        path.exists(cls._journal_path()):
+                    shards = range(SHARDS)
+            with cls._rwlock().read():
+                store = DATA[s_class]
+                if SHARDS > 1:
+                    copies = {}
+                    for k in shards:
+                        copies[layout[k]] = {
+                            i: dict.__getitem__(store, i)
+                            for i in cls._shard_members(k)}
+                else:
+                    copies = {layout[0]: dict.copy(store)}
+            for file_path, objs in copies.items():
+                cls._write_file(file_path, objs)
+            for fmt in FORMATS:
+                for file_path in [cls._file_path(fmt)] + cls._shard_paths(fmt):
+                    if file_path not in layout and path.exists(file_path):
+                        os.remove(file_path)
+            if path.exists(cls._journal_path()):
+                os.remove(cls._journal_path())
+            GENERATIONS[s_class] = {"file": cls._stored_signature(),
+                                    "journal": None, "offset": 0}
+            cls._bump_version()
 
     def save(self):
         """ Save current object
         """
-        s_class = self.__class__.__name__
+        cls = self.__class__
+        s_class = cls.__name__
         self.updated_at = datetime.utcnow()
-        DATA[s_class][self.id] = self
-        self.__class__.save_to_file()
+        with cls._locked():
+            cls._sync()
+            with cls._rwlock().write():
+                DATA[s_class][self.id] = self
+                self._index()
+                _track_id(s_class, self.id)
+            entry = None
+            if STORAGE_MODE == "journal":
+                entry = {"op": "put", "obj": self.to_json(True)}
+            cls._write_change(self.id, entry)
 
     def remove(self):
         """ Remove object
         """
-        s_class = self.__class__.__name__
-        if DATA[s_class].get(self.id) is not None:
-            del DATA[s_class][self.id]
-            self.__class__.save_to_file()
+        cls = self.__class__
+        s_class = cls.__name__
+        with cls._locked():
+            cls._sync()
+            with cls._rwlock().write():
+                if dict.get(DATA[s_class], self.id) is None:
+                    return
+                del DATA[s_class][self.id]
+                _unindex_object(s_class, self.id)
+                _untrack_id(s_class, self.id)
+            entry = None
+            if STORAGE_MODE == "journal":
+                entry = {"op": "del", "id": self.id}
+            cls._write_change(self.id, entry)
+
+    @classmethod
+    def _write_change(cls, obj_id: str, entry: Optional[dict]):
+        """ Persist the change of one object, or record it as pending
+        when writes are deferred
+
+        `entry` is the journal record of the change in journal mode
+        """
+        if _deferring():
+            with _pending_lock:
+                pending = PENDING.setdefault(cls, {})
+                pending.pop(obj_id, None)
+                pending[obj_id] = entry
+            if WRITE_BEHIND_INTERVAL > 0:
+                _start_flusher()
+        elif entry is not None:
+            cls._append_journal([entry])
+        else:
+            cls.save_to_file([_shard_of(obj_id, max(SHARDS, 1))])
+
+    @staticmethod
+    @contextmanager
+    def batch() -> Iterator[None]:
+        """ Defer every `save` and `remove` of this thread until the end
+        of the block, then write each changed class once
+        """
+        _batch_state.depth = getattr(_batch_state, 'depth', 0) + 1
+        try:
+            yield
+        finally:
+            _batch_state.depth -= 1
+            if _batch_state.depth == 0:
+                Base.flush()
+
+    @staticmethod
+    def flush():
+        """ Write the pending changes of every dirty class
+
+        The changes of a class whose write fails are kept pending for the
+        next flush, and the first error is raised once every class was
+        tried
+        """
+        with _flush_lock:
+            with _pending_lock:
+                pending = dict(PENDING)
+                PENDING.clear()
+            error = None
+            for cls, changes in pending.items():
+                try:
+                    cls._flush_changes(changes)
+                except Exception as e:
+                    cls._restore_pending(changes)
+                    error = error or e
+            if error is not None:
+                raise error
+
+    @classmethod
+    def _flush_changes(cls, changes: dict):
+        """ Write the deferred changes of the class
+        """
+        with cls._locked():
+            cls._merge_pending(changes)
+            if STORAGE_MODE == "journal" and None not in changes.values():
+                cls._append_journal(changes.values())
+            else:
+                cls.save_to_file({_shard_of(i, max(SHARDS, 1))
+                                  for i in changes})
+
+    @classmethod
+    def _restore_pending(cls, changes: dict):
+        """ Mark changes that could not be written as pending again,
+        behind those made since the flush started
+        """
+        with _pending_lock:
+            newer = PENDING.get(cls, {})
+            restored = {i: e for i, e in changes.items() if i not in newer}
+            restored.update(newer)
+            PENDING[cls] = restored
+
+    @classmethod
+    def _merge_pending(cls, changes: dict):
+        """ Reapply the deferred changes of this process on top of what
+        other processes wrote since, in shared mode
+        """
+        s_class = cls.__name__
+        with cls._rwlock().read():
+            local = {i: DATA[s_class].get(i) for i in changes}
+        if not cls._sync():
+            return
+        with cls._rwlock().write():
+            for obj_id, obj in local.items():
+                if obj is None:
+                    DATA[s_class].pop(obj_id, None)
+                    _unindex_object(s_class, obj_id)
+                    _untrack_id(s_class, obj_id)
+                else:
+                    DATA[s_class][obj_id] = obj
+                    obj._index()
+                    _track_id(s_class, obj_id)
 
     @classmethod
     def count(cls) -> int:
         """ Count all objects
         """
         s_class = cls.__name__
-        return len(DATA[s_class].keys())
+        cls._sync()
+        with cls._rwlock().read():
+            return len(DATA[s_class].keys())
 
     @classmethod
     def all(cls) -> Iterable[TypeVar('Base')]:
         """ Return all objects
         """
-        return cls.search()
+        s_class = cls.__name__
+        cls._sync()
+        with cls._rwlock().read():
+            return list(DATA[s_class].values())
+
+    @classmethod
+    def _sorted_ids(cls) -> List[str]:
+        """ Sorted IDs of the objects, cached until the class is reloaded;
+        call it holding the read lock
+        """
+        s_class = cls.__name__
+        order = ORDERS.get(s_class)
+        if order is None:
+            order = ORDERS[s_class] = sorted(DATA[s_class])
+        return order
+
+    @classmethod
+    def page(cls, limit: int, after: str = None
+             ) -> Tuple[List[TypeVar('Base')], Optional[str]]:
+        """ Return up to `limit` objects in ID order, starting after the
+        ID `after`, and the ID to pass as `after` for the next page, or
+        None if this page is the last one
+        """
+        s_class = cls.__name__
+        cls._sync()
+        with cls._rwlock().read():
+            order = cls._sorted_ids()
+            start = 0 if after is None else bisect_right(order, after)
+            ids = order[start:start + limit]
+            objs = [DATA[s_class][i] for i in ids]
+            last = start + limit >= len(order)
+        if not ids or last:
+            return objs, None
+        return objs, ids[-1]
 
     @classmethod
     def get(cls, id: str) -> TypeVar('Base'):
         """ Return one object by ID
         """
         s_class = cls.__name__
-        return DATA[s_class].get(id)
+        cls._sync()
+        with cls._rwlock().read():
+            return DATA[s_class].get(id)
 
     @classmethod
-    def search(cls, attributes: dict = {}) -> List[TypeVar('Base')]:
+    def query(cls, **conditions: Any) -> 'Query':
+        """ Return a Query over the objects, filtered by the conditions
+        as in `Query.filter`
+        """
+        from models.query import Query
+        return Query(cls).filter(**conditions)
+
+    @classmethod
+    def search(cls, attributes: dict = None) -> List[TypeVar('Base')]:
         """ Search all objects with matching attributes
         """
-        s_class = cls.__name__
+        query = cls.query()
+        for k, v in (attributes or {}).items():
+            query.where(k, 'eq', v)
+        return query.all()
 
-        def _search(obj):
-            if len(attributes) == 0:
-                return True
-            for k, v in attributes.items():
-                if (getattr(obj, k) != v):
-                    return False
-            return True
 
-        return list(filter(_search, DATA[s_class].values()))
+@atexit.register
+def _flush_on_exit():
+    """ Stop the write-behind thread and write what is still pending,
+    then the snapshots of the loaded classes
+    """
+    _flusher_stop.set()
+    try:
+        Base.flush()
+    except Exception:
+        logger.exception("pending changes lost at exit")
+    if SNAPSHOTS:
+        for cls in list(_loaded_classes.values()):
+            try:
+                cls.save_snapshot()
+            except OSError as e:
+                logger.warning("%s snapshot not saved: %s", cls.__name__, e)
@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+""" Benchmark module
+
+Time the operations of models.base on stores of growing size, in a
+scratch directory, with the storage settings taken from the environment:
+
+    python3 -m models.benchmark --sizes 1000 10000 -o bench.json
+    python3 -m models.benchmark --compare bench.json --threshold 0.2
+
+Results are written as JSON; with --compare, every operation more than
+`threshold` slower than in the baseline is reported and the exit status
+is 1
+"""
+from typing import Callable, Dict, List, Optional
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import models.base
+from models.base import Base
+from models.user import User
+
+
+SIZES = (1000, 10000, 100000, 1000000)
+SETTINGS = ("STORAGE_MODE", "STORAGE_FORMAT", "SHARDS", "LAZY_LOAD",
+            "SHARED_MODE", "SNAPSHOTS", "WRITE_BEHIND_INTERVAL")
+
+
+def measure(operation: Callable[[int], None], repeat: int) -> dict:
+    """ Run operation(i) for i in range(repeat), timing every call
+    """
+    times = []
+    for i in range(repeat):
+        start = time.perf_counter()
+        operation(i)
+        times.append(time.perf_counter() - start)
+    return {"ops": repeat, "seconds_per_op": statistics.median(times),
+            "min_seconds": min(times)}
+
+
+def populate(size: int) -> List[User]:
+    """ Store size new users and return them
+    """
+    User.load_from_file()
+    users = []
+    with Base.batch():
+        for i in range(size):
+            user = User(email="user{}@bench.local".format(i),
+                        first_name="first{}".format(i % 100),
+                        last_name="last{}".format(i))
+            user.save()
+            users.append(user)
+    return users
+
+
+def run_size(size: int, write_repeat: int = 5,
+             read_repeat: int = 1000) -> Dict[str, dict]:
+    """ Time every operation on a store of size users
+    """
+    users = populate(size)
+    rng = random.Random(size)
+    sample = [rng.choice(users) for _ in range(read_repeat)]
+    victims = rng.sample(users, min(write_repeat, size))
+    results = {}
+
+    def to_json(i):
+        user = sample[i]
+        user._json_cache = None
+        user.to_json()
+
+    results["get"] = measure(lambda i: User.get(sample[i].id), read_repeat)
+    results["search_hit"] = measure(
+        lambda i: User.search({"email": sample[i].email}), read_repeat)
+    results["search_miss"] = measure(
+        lambda i: User.search({"email": "missing{}".format(i)}),
+        read_repeat)
+    results["search_scan"] = measure(
+        lambda i: User.search({"last_name": sample[i].last_name}),
+        write_repeat)
+    results["to_json"] = measure(to_json, read_repeat)
+    results["all"] = measure(lambda i: User.all(), write_repeat)
+    results["save"] = measure(lambda i: sample[i].save(), write_repeat)
+    results["remove"] = measure(lambda i: victims[i].remove(),
+                                len(victims))
+    results["save_to_file"] = measure(lambda i: User.save_to_file(),
+                                      write_repeat)
+    results["load_from_file"] = measure(lambda i: User.load_from_file(),
+                                        write_repeat)
+    return results
+
+
+def git_revision() -> Optional[str]:
+    """ Commit of the working tree, or None outside a git checkout
+    """
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], check=True,
+            capture_output=True, text=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def benchmark(sizes: List[int], write_repeat: int = 5,
+              read_repeat: int = 1000) -> dict:
+    """ Run every size in its own scratch directory and return the
+    report
+    """
+    report = {
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "settings": {k: getattr(models.base, k) for k in SETTINGS},
+        "results": {},
+    }
+    cwd = os.getcwd()
+    for size in sizes:
+        workdir = tempfile.mkdtemp(prefix="models-bench-")
+        os.chdir(workdir)
+        try:
+            report["results"][str(size)] = run_size(size, write_repeat,
+                                                    read_repeat)
+        finally:
+            Base.flush()
+            models.base.DATA.pop(User.__name__, None)
+            models.base.GENERATIONS.pop(User.__name__, None)
+            os.chdir(cwd)
+            shutil.rmtree(workdir, ignore_errors=True)
+    return report
+
+
+def regressions(report: dict, baseline: dict, threshold: float
+                ) -> List[str]:
+    """ Operations of report slower than in baseline by more than
+    threshold, as a fraction of the baseline time
+    """
+    found = []
+    for size, results in report["results"].items():
+        for name, result in results.items():
+            before = baseline.get("results", {}).get(size, {}).get(name)
+            if not before or not before["seconds_per_op"]:
+                continue
+            ratio = result["seconds_per_op"] / before["seconds_per_op"]
+            if ratio > 1 + threshold:
+                found.append("{} at {}: {:.2f}x slower".format(name, size,
+                                                               ratio))
+    return found
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """ Run the benchmark from the command line and return the exit
+    status
+    """
+    parser = argparse.ArgumentParser(
+        description="Benchmark models.base operations at scale.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES)
+    parser.add_argument("--write-repeat", type=int, default=5)
+    parser.add_argument("--read-repeat", type=int, default=1000)
+    parser.add_argument("-o", "--output", default="-")
+    parser.add_argument("--compare", default=None,
+                        help="baseline JSON report to check against")
+    parser.add_argument("--threshold", type=float, default=0.2)
+    args = parser.parse_args(argv)
+
+    report = benchmark(args.sizes, args.write_repeat, args.read_repeat)
+    if args.output == "-":
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    else:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    if args.compare is None:
+        return 0
+    with open(args.compare) as f:
+        found = regressions(report, json.load(f), args.threshold)
+    for line in found:
+        print("regression: {}".format(line), file=sys.stderr)
+    return 1 if found else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+""" Migrate format module
+
+Rewrite the `.db_<Class>` files of the current directory in another
+format:
+
+    python3 -m models.migrate_format binary [User ...]
+"""
+from importlib import import_module
+from typing import List, Optional
+import glob
+import re
+import sys
+
+import models.base
+from models.base import Base
+from models.formats import FORMATS
+
+
+def model_class(s_class: str) -> type:
+    """ Import the model class named s_class from its models module,
+    e.g. UserSession from models.user_session
+    """
+    module = re.sub(r'(?<!^)(?=[A-Z])', '_', s_class).lower()
+    return getattr(import_module("models.{}".format(module)), s_class)
+
+
+def stored_classes() -> List[str]:
+    """ Names of the classes having an objects file in the current
+    directory
+    """
+    names = set()
+    for fmt in FORMATS.values():
+        pattern = re.compile(r"\.db_(\w+?)(\.\d+)?{}$".format(
+            re.escape(fmt.extension)))
+        for file_path in glob.glob(".db_*{}".format(fmt.extension)):
+            match = pattern.match(file_path)
+            if match:
+                names.add(match.group(1))
+    return sorted(names)
+
+
+def migrate(fmt: str, classes: Optional[List[str]] = None) -> List[str]:
+    """ Load the objects of every class, whatever the format of its file,
+    and save them again in fmt. Return the names of the migrated classes
+    """
+    if fmt not in FORMATS:
+        raise ValueError("format must be one of {}".format(list(FORMATS)))
+    classes = classes or stored_classes()
+    previous = models.base.STORAGE_FORMAT
+    models.base.STORAGE_FORMAT = fmt
+    try:
+        for s_class in classes:
+            cls = model_class(s_class)
+            if not issubclass(cls, Base):
+                raise ValueError("{} is not a model".format(s_class))
+            cls.load_from_file()
+            cls.save_to_file()
+    finally:
+        models.base.STORAGE_FORMAT = previous
+    return classes
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        sys.exit("usage: python3 -m models.migrate_format {} [Class ...]"
+                 .format("|".join(FORMATS)))
+    for s_class in migrate(sys.argv[1], sys.argv[2:]):
+        print("{} migrated to {}".format(s_class, sys.argv[1]))
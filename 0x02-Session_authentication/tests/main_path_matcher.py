@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+""" Main path matcher
+
+Auth.require_auth: compiled excluded paths decide like a scan of the
+list of paths
+"""
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from api.v1.auth.auth import Auth, PathMatcher  # noqa: E402
+
+
+def scan(path: str, excluded_paths: list) -> bool:
+    """ require_auth decided by testing every excluded path in turn, as
+    before paths were compiled
+    """
+    if path is None or not excluded_paths:
+        return True
+    path = path.rstrip('/')
+    for excluded_path in excluded_paths:
+        if excluded_path.endswith('*'):
+            if path.startswith(excluded_path[:-1]):
+                return False
+        elif path == excluded_path.rstrip('/'):
+            return False
+    return True
+
+
+a = Auth()
+excluded = ["/api/v1/stat*", "/api/v1/unauthorized/", "/api/v1/forbidden"]
+for path, expected in [("/api/v1/status", False), ("/api/v1/stats", False),
+                       ("/api/v1/status/", False), ("/api/v1/users", True),
+                       ("/api/v1/unauthorized", False),
+                       ("/api/v1/forbidden/", False), ("/api/v1/st", True),
+                       (None, True)]:
+    assert a.require_auth(path, excluded) is expected, path
+    assert a.require_auth(path, PathMatcher(excluded)) is expected, path
+assert a.require_auth("/api/v1/users", None) is True
+assert a.require_auth("/api/v1/users", []) is True
+assert a.require_auth("/api/v1/users", PathMatcher()) is True
+assert a.require_auth("/", ["*"]) is False
+
+rng = random.Random(0)
+parts = ["", "/", "api", "v1", "stat", "status", "users", "us", "*"]
+for _ in range(3000):
+    excluded = ["/" + "/".join(rng.choice(parts)
+                               for _ in range(rng.randint(0, 3)))
+                for _ in range(rng.randint(0, 6))]
+    matcher = PathMatcher(excluded)
+    for _ in range(10):
+        path = "/" + "/".join(rng.choice(parts[:-1])
+                              for _ in range(rng.randint(0, 4)))
+        expected = scan(path, excluded)
+        assert a.require_auth(path, excluded) is expected, (path, excluded)
+        assert a.require_auth(path, matcher) is expected, (path, excluded)
+print("OK")